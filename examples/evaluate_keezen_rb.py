@@ -4,13 +4,18 @@ Set path of the experiment and identify the agent by the number of frames.
 """
 import os
 import argparse
-import rlcard
+from functools import partial
 from rlcard.games.keezen.agent import RuleBasedAgent, RuleBasedAgentAdapter
-from rlcard.utils import get_device, set_seed, tournament
+from rlcard.games.keezen.numpyagent import NumpyDMCAgent
+from rlcard.envs.keezen import tournament
+from rlcard.utils import get_device, set_seed
 
 
 def load_model(model_path, env=None, position=None, device=None, game=None):
-    if os.path.isfile(model_path):  # Torch model
+    if model_path.endswith('.npz'):  # Numpy model, see export_dmc_keezen.py
+        print("Numpy: " + model_path)
+        agent = NumpyDMCAgent.load(model_path)
+    elif os.path.isfile(model_path):  # Torch model
         print("Torch: " + model_path)
         import torch
         agent = torch.load(model_path, map_location=device)
@@ -26,25 +31,21 @@ def load_model(model_path, env=None, position=None, device=None, game=None):
     return agent
 
 
+def load_agents(env, models, device):
+    return [load_model(model_path, env, position, device, env.game.game) for position, model_path in enumerate(models)]
+
+
 def evaluate(args):
 
     # To use the cpu, if a training is claiming the GPU: device = torch.device("cpu")
-    device = get_device()
+    device = get_device() if any(model_path.endswith('.pth') for model_path in args.models) else None
 
     # Seed numpy, torch, random
     set_seed(args.seed)
 
-    # Make the environment with seed
-    env = rlcard.make(args.env, config={'seed': args.seed})
-
-    # Load models
-    agents = []
-    for position, model_path in enumerate(args.models):
-        agents.append(load_model(model_path, env, position, device, env.game.game))
-    env.set_agents(agents)
-
-    # Evaluate
-    rewards = tournament(env, args.num_games)
+    # Evaluate: each worker makes the environment with seed and loads the models
+    rewards, _, _ = tournament({'seed': args.seed}, partial(load_agents, models=args.models, device=device),
+                               args.num_games, args.num_workers, args.num_concurrent)
     for position, reward in enumerate(rewards):
         print(position, args.models[position], reward)
     return rewards
@@ -58,6 +59,8 @@ if __name__ == '__main__':
     parser.add_argument('--cuda', type=str, default='0')
     parser.add_argument('--seed', type=int, default=None)
     parser.add_argument('--num_games', type=int, default=4000)
+    parser.add_argument('--num_workers', type=int, default=None)  # Default the number of cpus
+    parser.add_argument('--num_concurrent', type=int, default=None)  # Games per worker with batched forwards
 
     path = './experiments/dmc_keezen_result/keezenexpid8/'
     frames = '4512537600'  # The number of frames of the model
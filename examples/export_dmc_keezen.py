@@ -0,0 +1,27 @@
+"""Exports trained DMC models to numpy
+Converts the torch models (<position>_<frames>.pth) of an experiment folder to .npz files next to them, that the
+evaluation scripts load with NumpyDMCAgent, without torch. Models that are already exported are skipped.
+Set the path of the experiment.
+"""
+import fnmatch
+import os
+import argparse
+import torch
+from rlcard.games.keezen.numpyagent import export_dmc_agent
+
+
+def export(path):
+    for file in sorted(fnmatch.filter(os.listdir(path), "*.pth")):
+        npz_path = path + file[:-4] + ".npz"
+        if not os.path.isfile(npz_path):
+            agent = torch.load(path + file, map_location="cpu")
+            export_dmc_agent(agent, npz_path)
+            print("Exported: " + npz_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Export DMC Keezen models to numpy")
+    parser.add_argument('--path', type=str, default='./experiments/dmc_keezen_result/keezenexpid8/')
+    args = parser.parse_args()
+
+    export(args.path)
@@ -1,6 +1,6 @@
 import unittest
 
-from board import Board, FieldColor, BoardState
+from board import Board, FieldColor, FieldType, BoardState
 from player import Player, Team, PlayerLocation
 
 
@@ -123,6 +123,47 @@ class TestBoard(unittest.TestCase):
         BoardState.put_marble_on_field(blue_marble2, self.board.fields[52], self.fields_with_marbles)
         self.assertListEqual([], self.board.get_path_for_marble(blue_marble2, 5, self.fields_with_marbles))
 
+    def test_get_path_table_entry(self):
+        # Green marble from field 42 passes the blue start field 53 and can be blocked there
+        path, blocking_indexes, _ = Board.get_path_table_entry(FieldColor.GREEN, self.board.fields[42], 12)
+        self.assertEqual([43, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62], [field.id_ for field in path])
+        self.assertEqual((2,), blocking_indexes)
+        # Blue marble enters its home fields, each home field can block
+        path, blocking_indexes, _ = Board.get_path_table_entry(FieldColor.BLUE, self.board.fields[42], 5)
+        self.assertEqual([43, 52, 51, 50, 49], [field.id_ for field in path])
+        self.assertEqual((2, 3, 4), blocking_indexes)
+
+    def test_position_index(self):
+        blue_marble = self.board.get_marbles_with_color(FieldColor.BLUE)[0]
+        green_marble = self.board.get_marbles_with_color(FieldColor.GREEN)[0]
+        self.assertEqual(68, BoardState.get_field_for_marble(blue_marble, self.fields_with_marbles).id_)
+        BoardState.put_marble_on_field(blue_marble, self.board.fields[53], self.fields_with_marbles)
+        self.assertEqual(blue_marble, BoardState.get_marble_for_field_opt(self.board.fields[53], self.fields_with_marbles))
+        self.assertEqual(None, BoardState.get_marble_for_field_opt(self.board.fields[68], self.fields_with_marbles))
+        # Hit the blue marble, the index of the copy is independent
+        c_state = self.fields_with_marbles.copy()
+        hit_marble = BoardState.put_marble_on_field(green_marble, self.board.fields[53], c_state)
+        self.assertEqual(blue_marble, hit_marble)
+        self.assertEqual(None, BoardState.get_field_for_marble(blue_marble, c_state))
+        self.assertEqual(self.board.fields[53], BoardState.get_field_for_marble(blue_marble, self.fields_with_marbles))
+        self.assertEqual(self.board.fields[53].mask, c_state.color_masks[FieldColor.GREEN] & self.board.fields[53].mask)
+        self.assertEqual(0, c_state.color_masks[FieldColor.BLUE] & self.board.fields[53].mask)
+        self.assertTrue(c_state.has_marble_with_color_on([(FieldColor.GREEN, self.board.fields[53].mask)]))
+        BoardState.reset(self.board, c_state)
+        self.assertEqual(16, len(c_state))
+        for marble in self.board.marbles:
+            self.assertEqual(FieldType.WAIT, BoardState.get_field_for_marble(marble, c_state).type_)
+
+    def test_marble_ranks(self):
+        blue_marbles = self.board.get_marbles_with_color(FieldColor.BLUE)
+        self.assertEqual([3, 2, 1, 0], [self.fields_with_marbles.marble_ranks[m.id_] for m in blue_marbles])
+        BoardState.put_marble_on_field(blue_marbles[0], self.board.fields[53], self.fields_with_marbles)
+        self.assertEqual([0, 3, 2, 1], [self.fields_with_marbles.marble_ranks[m.id_] for m in blue_marbles])
+        c_state = self.fields_with_marbles.copy()
+        BoardState.put_marble_on_field(blue_marbles[3], self.board.fields[54], c_state)
+        self.assertEqual([1, 3, 2, 0], [c_state.marble_ranks[m.id_] for m in blue_marbles])
+        self.assertEqual([0, 3, 2, 1], [self.fields_with_marbles.marble_ranks[m.id_] for m in blue_marbles])
+
     # def test_set_fields_with_marbles(self):
     #     new_fields_with_marbles = dict(self.fields_with_marbles)
     #     blue_marble = self.board.get_marbles_with_color(FieldColor.BLUE)[0]
@@ -3,7 +3,7 @@ import unittest
 from board import FieldColor, Board, BoardState
 from card import Card, CardValue, Suit
 from cardop import CardOpStart, CardOpRun, CardOpSwitchOneOwnMarble, CardOpSplitTwoMarbles
-from move import MoveType
+from move import MoveType, CompactMove
 from player import Team, Player, PlayerLocation
 
 
@@ -95,6 +95,21 @@ class TestCardOp(unittest.TestCase):
                                  self.fields_with_marbles)
         self.assertEqual(40, len(moves))  # 4x7 + 4X6+1x3 + 4x5+2x3 + 4x4+3x3 = 40
 
+    def test_cardop_compact_moves(self):
+        cardop = CardOpSplitTwoMarbles(self.board)
+        card7 = Card(Suit.CLUBS, CardValue.SEVEN, 7)
+        green_marbles = self.board.get_marbles_with_color(FieldColor.GREEN)
+        BoardState.put_marble_on_field(green_marbles[0], self.board.fields[5], self.fields_with_marbles)
+        BoardState.put_marble_on_field(green_marbles[1], self.board.fields[8], self.fields_with_marbles)
+        compact_moves = cardop.get_compact_moves(self.players[0], self.players[0].player_color, card7,
+                                                 self.fields_with_marbles)
+        moves = cardop.get_moves(self.players[0], self.players[0].player_color, card7, self.fields_with_marbles)
+        self.assertEqual(len(compact_moves), len(moves))
+        for compact_move, move in zip(compact_moves, moves):
+            self.assertEqual(compact_move, CompactMove.from_move(move))
+            for marble_move in move.marble_moves:
+                self.assertEqual(marble_move.to_field, marble_move.steps[-1])
+
     def test_cardop_split_home(self):
         cardop = CardOpSplitTwoMarbles(self.board)
         card7 = Card(Suit.CLUBS, CardValue.SEVEN, 7)
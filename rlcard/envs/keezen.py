@@ -1,10 +1,13 @@
 from collections import OrderedDict
+import multiprocessing
+import os
+import random
 import numpy as np
 from rlcard.envs import Env
-from rlcard.games.keezen.board import BoardState
-from rlcard.games.keezen.card import CardState
+from rlcard.envs.registration import DEFAULT_CONFIG
 from rlcard.games.keezen.game import GameActions
 from rlcard.games.keezen.keezengameadapter import KeezenGameAdapter
+from rlcard.games.keezen.observation import ObservationEncoder, encode_observation
 
 DEFAULT_GAME_CONFIG = {
         'game_num_players': 4,
@@ -12,10 +15,21 @@ DEFAULT_GAME_CONFIG = {
 
 
 class KeezenEnv(Env):
-    """ Keezen Environment."""
+    """ Keezen Environment.
+    Config 'observation_mode': 'incremental' (default) takes the observation from the encoder that is patched by each
+    move, 'stateless' builds it from scratch.
+    Config 'seed' and 'game_index': the cards are shuffled with a random generator of the game, derived from
+    (seed, game index). The game index (default 0) separates the games of parallel workers with the same seed.
+    Config 'legal_actions_mode': 'dict' (default) gives the legal actions as dict action index -> action matrix,
+    'arrays' adds fixed shape arrays as well: 'legal_action_mask' (bool per action index), 'legal_action_ids' and
+    'legal_action_features' ([max_legal_actions] and [max_legal_actions, 68], padded with -1 and 0) and
+    'num_legal_actions'. Config 'max_legal_actions' sets the padded size, default the number of actions."""
 
     def __init__(self, config):
         self.name = 'keezen'
+        self.observation_mode = config.get('observation_mode', 'incremental')
+        self.game_index = config.get('game_index', 0)
+        self.legal_actions_mode = config.get('legal_actions_mode', 'dict')
         self.default_game_config = DEFAULT_GAME_CONFIG
         self.game = KeezenGameAdapter()
         self.action_num = self.game.get_action_num()
@@ -39,29 +53,71 @@ class KeezenEnv(Env):
         self.raw_legal_actions = {}
         for i in range(len(GameActions.ALL_ACTIONS_271)):
             self.raw_legal_actions[i] = GameActions.ALL_ACTIONS_271[i]
+        self.max_legal_actions = config.get('max_legal_actions', self.action_num)
+        # Buffers for the 'arrays' legal actions mode, filled per state and copied to the state
+        self._legal_action_mask = np.zeros(self.action_num, dtype=bool)
+        self._legal_action_ids = np.full(self.max_legal_actions, -1, dtype=np.int16)
+        self._legal_action_features = np.zeros((self.max_legal_actions, 68), dtype=np.int8)
+        # Buffer for the 'stateless' observation mode, encoded per state and copied to the state
+        self._observation = np.empty(ObservationEncoder.OBSERVATION_SIZE, dtype=np.int8)
 
     def _extract_state(self, state):
-        fields_with_marbles = state['fields_with_marbles']
         cur_player = state['state_for_player']
-        play_with_color = state['players_play_with_color']
-
-        cur_player_plays_with_color = play_with_color[cur_player]
-        own_cards = CardState.get_card_state_as_matrix(self.game.game_state.player_cards[cur_player])
-        played_cards = CardState.get_card_state_as_matrix(self.game.game_state.played_cards)
-        board_matrix = BoardState.get_board_state_as_matrix(fields_with_marbles, self.game.game.board, cur_player,
-                                                            cur_player_plays_with_color, self.game.game.players)
-        active_player = np.zeros(5, dtype=np.int8)
         index_of_cur_player = self.game.game.players.index(cur_player)
-        active_player[index_of_cur_player] = 1
-        extracted_state = OrderedDict({'obs': np.concatenate((active_player, own_cards, played_cards, board_matrix)),
-                                       'player_id': self.game.game.players.index(cur_player),
-                                       'legal_actions': self._get_legal_actions(),
+        if self.observation_mode == 'stateless':
+            obs = encode_observation(state['game_state'], index_of_cur_player, self.game.game.players,
+                                     self.game.game.board, self._observation).copy()
+        else:
+            obs = state['game_state'].observation.get_observation(index_of_cur_player)
+        legal_actions = self._get_legal_actions()
+        extracted_state = OrderedDict({'obs': obs,
+                                       'player_id': index_of_cur_player,
+                                       'legal_actions': legal_actions,
                                        'allowed_moves': state.get("allowed_moves"),
+                                       'compact_moves': state.get("compact_moves"),
                                        'action_record': self.action_recorder,
                                        'raw_legal_actions': self.raw_legal_actions})
+        if self.legal_actions_mode == 'arrays':
+            extracted_state.update(self._get_legal_action_arrays(legal_actions))
         extracted_state['game_state'] = state['game_state']
         return extracted_state
 
+    def _get_legal_action_arrays(self, legal_actions):
+        """Returns the legal actions as fixed shape arrays: mask, padded action ids and features, and count."""
+        num_legal_actions = len(legal_actions)
+        if num_legal_actions > self.max_legal_actions:
+            raise ValueError("Number of legal actions {0} exceeds max_legal_actions {1}.".format(
+                num_legal_actions, self.max_legal_actions))
+        self._legal_action_mask[:] = False
+        self._legal_action_ids[:] = -1
+        self._legal_action_features[:] = 0
+        if num_legal_actions:
+            action_ids = np.fromiter(legal_actions.keys(), dtype=np.int16, count=num_legal_actions)
+            self._legal_action_mask[action_ids] = True
+            self._legal_action_ids[:num_legal_actions] = action_ids
+            np.stack(list(legal_actions.values()), out=self._legal_action_features[:num_legal_actions])
+        return {'legal_action_mask': self._legal_action_mask.copy(),
+                'legal_action_ids': self._legal_action_ids.copy(),
+                'legal_action_features': self._legal_action_features.copy(),
+                'num_legal_actions': num_legal_actions}
+
+    def seed(self, seed=None):
+        seed = super().seed(seed)
+        self.game.game.seed(seed, self.game_index)
+        return seed
+
+    def save_game(self):
+        """ Returns the current game, its game state and random generator, to continue it later with restore_game. One
+        env can take turns in several games this way, as long as step back is off. The states of the global numpy and
+        random generators, that agents draw random moves from, are saved with the game."""
+        return self.game.game_state, self.game.game.rng, np.random.get_state(), random.getstate()
+
+    def restore_game(self, saved_game):
+        """ Continues a game of save_game, the global generators continue where they were in that game."""
+        self.game.game_state, self.game.game.rng, np_random_state, random_state = saved_game
+        np.random.set_state(np_random_state)
+        random.setstate(random_state)
+
     def get_payoffs(self):
         """ Get the payoffs of players. Returns: payoffs (list): a list of payoffs for each player"""
         is_over, rewards = self.game.game.is_over(self.game.game_state)
@@ -81,6 +137,177 @@ class KeezenEnv(Env):
 
     def _get_legal_actions(self):
         """ Get all legal actions (idx and matrix) for current state."""
-        legal_actions = self.game.get_state_for_current_player()["legal_actions"]
-        return legal_actions
+        return self.game.get_legal_actions()
+
+
+
+class KeezenVecEnv:
+    """ N Keezen environments stepped in lockstep, so one batched forward can serve the current players of all games.
+    reset() and step(actions) return batched states: 'obs' [N, 615], 'player_id' [N], 'legal_action_mask' [N, 271],
+    'legal_action_ids' [N, max_legal_actions], 'legal_action_features' [N, max_legal_actions, 68] and
+    'num_legal_actions' [N] (see the 'arrays' legal actions mode of KeezenEnv).
+    A finished game is reset automatically: step returns its payoffs and done flag, and the state of the new game.
+    Game i gets game index 'game_index' + i, so all games have their own random generator for the config 'seed'."""
+
+    STATE_KEYS = ('obs', 'player_id', 'legal_action_mask', 'legal_action_ids', 'legal_action_features',
+                  'num_legal_actions')
+
+    def __init__(self, num_envs, config=None):
+        config = dict(DEFAULT_CONFIG, **(config or {}))
+        first_game_index = config.get('game_index', 0)
+        config['legal_actions_mode'] = 'arrays'
+        self.num_envs = num_envs
+        self.envs = []
+        for i in range(num_envs):
+            config['game_index'] = first_game_index + i
+            self.envs.append(KeezenEnv(dict(config)))
+        self.num_players = self.envs[0].num_players
+        self.num_actions = self.envs[0].num_actions
+        self.states = [None] * num_envs
+
+    def reset(self):
+        """Resets all games and returns the batched states."""
+        for i, env in enumerate(self.envs):
+            self.states[i], _ = env.reset()
+        return self._get_batched_states()
+
+    def step(self, actions):
+        """Takes an action index per game and returns the batched states, payoffs [N, num players] and dones [N].
+        The payoffs are zero for games that are not done."""
+        payoffs = np.zeros((self.num_envs, self.num_players), dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            self.states[i], _ = env.step(int(action))
+            if env.is_over():
+                payoffs[i] = env.get_payoffs()
+                dones[i] = True
+                self.states[i], _ = env.reset()
+        return self._get_batched_states(), payoffs, dones
+
+    def _get_batched_states(self):
+        return {key: np.stack([state[key] for state in self.states]) for key in KeezenVecEnv.STATE_KEYS}
+
+
+def tournament(config, load_agents, num_games, num_workers=None, num_concurrent=None):
+    """ Plays num_games games on a pool of num_workers processes (default the number of cpus), like the tournament of
+    rlcard.utils. The games are split in shards of consecutive game indexes, one per worker. A worker makes its own
+    env with the config and loads its agents once with load_agents(env), a picklable function that returns the agents
+    per player. Game i is dealt with the random generator of (config 'seed', i), see KeezenEnv, and the global numpy
+    and random generators that random agents use are seeded with (seed, i) before it, so the games do not depend on
+    the number of workers. With num_concurrent a worker plays that many games at a time and batches the
+    decisions of agents with a value network, see play_batched_tournament_games.
+    Returns the average payoffs per player, the payoffs [num_games, num players] and number of moves [num_games]."""
+    num_workers = max(1, min(num_workers or os.cpu_count(), num_games))
+    bounds = np.linspace(0, num_games, num_workers + 1).astype(int)
+    shards = [(config, load_agents, start, stop, num_concurrent) for start, stop in zip(bounds[:-1], bounds[1:])]
+    if num_workers == 1:
+        results = [_run_tournament_shard(*shards[0])]
+    else:
+        with multiprocessing.get_context('spawn').Pool(num_workers) as pool:  # Spawn: no forked torch or cuda state
+            results = pool.starmap(_run_tournament_shard, shards)
+    payoffs = np.concatenate([shard_payoffs for shard_payoffs, _ in results])
+    lengths = np.concatenate([shard_lengths for _, shard_lengths in results])
+    return payoffs.mean(axis=0).tolist(), payoffs, lengths
+
+
+def _run_tournament_shard(config, load_agents, start, stop, num_concurrent=None):
+    """ Worker of tournament: makes the env and agents and plays the games start..stop-1."""
+    config = dict(DEFAULT_CONFIG, **config)
+    if num_concurrent:
+        config['legal_actions_mode'] = 'arrays'
+    env = KeezenEnv(config)
+    env.set_agents(load_agents(env))
+    if num_concurrent:
+        return play_batched_tournament_games(env, config.get('seed'), start, stop, num_concurrent)
+    return play_tournament_games(env, config.get('seed'), start, stop)
+
+
+def play_tournament_games(env, seed, start, stop):
+    """ Plays the games with game index start..stop-1 of a tournament with the agents of the env, game i is dealt
+    with the random generator of (seed, i). Returns their payoffs and number of moves."""
+    base_seed = env.seed(seed)  # A random base seed if seed is None
+    payoffs = np.zeros((stop - start, env.num_players), dtype=np.float32)
+    lengths = np.zeros(stop - start, dtype=np.int32)
+    for i, game_index in enumerate(range(start, stop)):
+        _seed_global_generators(seed, game_index)
+        env.game_index = game_index
+        env.seed(base_seed)
+        trajectories, payoffs[i] = env.run(is_training=False)
+        lengths[i] = sum((len(trajectory) - 1) // 2 for trajectory in trajectories)
+    return payoffs, lengths
+
+
+def play_batched_tournament_games(env, seed, start, stop, num_concurrent):
+    """ Plays the games start..stop-1 like play_tournament_games, num_concurrent games at a time that take turns on
+    the env, see save_game. The decisions of agents with a value network, a forward(obs, actions) like DMCAgent, are
+    collected over the games and evaluated with one forward per agent. The other agents get an eval_step per decision.
+    The env needs the 'arrays' legal actions mode. The states of the global generators are kept per game, so agents
+    that play random moves play the same moves as in play_tournament_games."""
+    agents = env.agents
+    base_seed = env.seed(seed)
+    payoffs = np.zeros((stop - start, env.num_players), dtype=np.float32)
+    lengths = np.zeros(stop - start, dtype=np.int32)
+    games = [_start_tournament_game(env, seed, base_seed, game_index)
+             for game_index in range(start, min(stop, start + num_concurrent))]
+    next_game_index = start + len(games)
+    while games:
+        actions = [None] * len(games)
+        batches = {}  # Agent id -> agent and the games it decides in
+        for i, (_, _, state, player_id) in enumerate(games):
+            agent = agents[player_id]
+            if hasattr(agent, 'forward'):
+                batches.setdefault(id(agent), (agent, []))[1].append(i)
+            else:
+                env.restore_game(games[i][0])
+                actions[i], _ = agent.eval_step(state)
+                games[i][0] = env.save_game()  # With the global generators after the decision
+        for agent, indexes in batches.values():
+            for i, action in zip(indexes, _get_batched_actions(agent, [games[i][2] for i in indexes])):
+                actions[i] = action
+        playing = []
+        for game, action in zip(games, actions):
+            saved_game, game_index, _, player_id = game
+            env.restore_game(saved_game)
+            game[2], game[3] = env.step(action, agents[player_id].use_raw)
+            lengths[game_index - start] += 1
+            if not env.is_over():
+                game[0] = env.save_game()
+                playing.append(game)
+                continue
+            payoffs[game_index - start] = env.get_payoffs()
+            if next_game_index < stop:
+                playing.append(_start_tournament_game(env, seed, base_seed, next_game_index))
+                next_game_index += 1
+        games = playing
+    return payoffs, lengths
+
+
+def _seed_global_generators(seed, game_index):
+    if seed is not None:  # Agents that play random moves use the global generators, seeded per game
+        np.random.seed([seed, game_index])
+        random.seed(int(np.random.randint(2 ** 31)))
+
+
+def _start_tournament_game(env, seed, base_seed, game_index):
+    _seed_global_generators(seed, game_index)
+    env.game_index = game_index
+    env.seed(base_seed)
+    state, player_id = env.reset()
+    return [env.save_game(), game_index, state, player_id]
+
 
+def _get_batched_actions(agent, states):
+    """ Returns per state the legal action with the highest value, with one forward of the agent for all states."""
+    num_legal_actions = np.array([state['num_legal_actions'] for state in states])
+    obs = np.repeat(np.stack([state['obs'] for state in states]).astype(np.float32), num_legal_actions, axis=0)
+    actions = np.concatenate([state['legal_action_features'][:num] for state, num in zip(states, num_legal_actions)])
+    actions = actions.astype(np.float32)
+    if hasattr(agent, 'net'):  # Torch model of DMCAgent
+        import torch
+        with torch.no_grad():
+            values = agent.forward(torch.from_numpy(obs).to(agent.device), torch.from_numpy(actions).to(agent.device))
+        values = values.cpu().numpy()
+    else:
+        values = agent.forward(obs, actions)
+    return [state['legal_action_ids'][np.argmax(state_values)]
+            for state, state_values in zip(states, np.split(values, np.cumsum(num_legal_actions)[:-1]))]
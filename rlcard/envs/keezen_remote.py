@@ -0,0 +1,189 @@
+import collections
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from rlcard.envs.keezen import KeezenEnv, play_tournament_games
+from rlcard.envs.registration import DEFAULT_CONFIG
+
+_HEADER = struct.Struct('>I')  # Length of the JSON message that follows
+
+
+def send_message(sock, message):
+    """ Sends a message, a JSON serializable dict, with a length prefix."""
+    data = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def receive_message(sock):
+    """ Receives a message of send_message, None if the connection was closed."""
+    header = _receive_bytes(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _receive_bytes(sock, _HEADER.unpack(header)[0])
+    return None if data is None else json.loads(data)
+
+
+def _receive_bytes(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class TournamentCoordinator:
+    """ Hands out the games of tournaments as jobs to workers on other machines (see run_tournament_worker) over TCP
+    and collects the results. A job has the models per player, the env config with the seed and a range of game
+    indexes, so the games are the same as in the tournament of the keezen env.
+    A worker asks for a job, plays it and sends the result with its next request. When a worker disconnects, or does
+    not send a result within job_timeout seconds (None waits forever), its job is handed out again. Messages are JSON
+    objects with a length prefix, see send_message."""
+    WAIT_SECONDS = 0.5  # Time a worker waits before asking again when all jobs are handed out
+    JOB_TIMEOUT = 600.0  # Default seconds a worker may take for a job
+
+    def __init__(self, host='localhost', port=0, job_timeout=JOB_TIMEOUT):
+        self.job_timeout = job_timeout
+        self.condition = threading.Condition()
+        self.jobs = {}  # Job id -> job message
+        self.pending = collections.deque()  # Ids of jobs to hand out
+        self.tournaments = []  # Per tournament: payoffs, lengths and ids of the jobs without result
+        self.closed = False
+        self.server = socketserver.ThreadingTCPServer((host, port), _CoordinatorHandler)
+        self.server.daemon_threads = True
+        self.server.coordinator = self
+        self.address = self.server.server_address
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add_tournament(self, models, num_games, config=None, games_per_job=100) -> int:
+        """ Adds a tournament of num_games games of the models per player (paths or names the load_agents of the
+        workers understand) and returns its index. Without 'seed' in the config a random seed is used."""
+        config = dict(config or {})
+        if config.get('seed') is None:
+            config['seed'] = int(np.random.SeedSequence().generate_state(1)[0])
+        with self.condition:
+            index = len(self.tournaments)
+            job_ids = set()
+            for start in range(0, num_games, games_per_job):
+                job_id = len(self.jobs)
+                self.jobs[job_id] = {'type': 'job', 'job_id': job_id, 'tournament': index, 'models': list(models),
+                                     'config': config, 'start': start, 'stop': min(start + games_per_job, num_games)}
+                self.pending.append(job_id)
+                job_ids.add(job_id)
+            self.tournaments.append((np.zeros((num_games, len(models)), dtype=np.float32),
+                                     np.zeros(num_games, dtype=np.int32), job_ids))
+        return index
+
+    def wait(self, timeout=None):
+        """ Waits until the results of all tournaments are in. Returns per tournament the average payoffs per player,
+        the payoffs [num_games, num players] and number of moves [num_games], like the tournament of the keezen env.
+        Raises TimeoutError if the results are not in within timeout seconds (None waits forever)."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: not any(job_ids for _, _, job_ids in self.tournaments), timeout):
+                raise TimeoutError("Tournament results not in within {0} seconds.".format(timeout))
+            return [(payoffs.mean(axis=0).tolist(), payoffs, lengths) for payoffs, lengths, _ in self.tournaments]
+
+    def close(self):
+        """ Stops the workers at their next request and stops accepting connections."""
+        with self.condition:
+            self.closed = True
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get_job(self):
+        with self.condition:
+            if self.closed:
+                return {'type': 'stop'}
+            if not self.pending:
+                return {'type': 'wait', 'seconds': TournamentCoordinator.WAIT_SECONDS}
+            return self.jobs[self.pending.popleft()]
+
+    def _set_result(self, job_id, payoffs, lengths):
+        with self.condition:
+            job = self.jobs[job_id]
+            tournament_payoffs, tournament_lengths, job_ids = self.tournaments[job['tournament']]
+            if job_id in job_ids:  # A job handed out again can have two results
+                tournament_payoffs[job['start']:job['stop']] = payoffs
+                tournament_lengths[job['start']:job['stop']] = lengths
+                job_ids.remove(job_id)
+                self.condition.notify_all()
+
+    def _hand_out_again(self, job_id):
+        with self.condition:
+            job = self.jobs[job_id]
+            if job_id in self.tournaments[job['tournament']][2] and job_id not in self.pending:
+                self.pending.appendleft(job_id)
+
+
+class _CoordinatorHandler(socketserver.BaseRequestHandler):
+    """ Connection of a worker to the coordinator."""
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        self.request.settimeout(coordinator.job_timeout)
+        job_id = None
+        try:
+            while True:
+                message = receive_message(self.request)
+                if message is None:
+                    break
+                if message['type'] == 'result':
+                    coordinator._set_result(message['job_id'], message['payoffs'], message['lengths'])
+                    job_id = None
+                reply = coordinator._get_job()
+                if reply['type'] == 'job':
+                    job_id = reply['job_id']
+                send_message(self.request, reply)
+                if reply['type'] == 'stop':
+                    break
+        except (OSError, ValueError):  # Lost connection, timeout or garbled message
+            pass
+        finally:
+            if job_id is not None:
+                coordinator._hand_out_again(job_id)
+
+
+def run_tournament_worker(host, port, load_agents):
+    """ Plays the jobs of the TournamentCoordinator at (host, port) until it stops or cannot be reached. When the
+    connection is lost, for example because a job took longer than the job timeout, the worker connects again and
+    sends its last message again, a result is still taken if the job has no result yet.
+    load_agents(env, models) returns the agents per player for the models of a job, they are loaded once per models
+    and config."""
+    envs = {}
+    message = {'type': 'get'}
+    sock = socket.create_connection((host, port))
+    try:
+        while True:
+            try:
+                send_message(sock, message)
+                job = receive_message(sock)
+            except OSError:
+                job = None
+            if job is None:  # Lost connection
+                sock.close()
+                try:
+                    sock = socket.create_connection((host, port))
+                except OSError:
+                    return  # The coordinator is gone
+                continue
+            if job['type'] == 'stop':
+                return
+            if job['type'] == 'wait':
+                time.sleep(job['seconds'])
+                message = {'type': 'get'}
+                continue
+            key = json.dumps([job['models'], job['config']], sort_keys=True)
+            if key not in envs:
+                env = KeezenEnv(dict(DEFAULT_CONFIG, **job['config']))
+                env.set_agents(load_agents(env, job['models']))
+                envs[key] = env
+            payoffs, lengths = play_tournament_games(envs[key], job['config']['seed'], job['start'], job['stop'])
+            message = {'type': 'result', 'job_id': job['job_id'], 'payoffs': payoffs.tolist(),
+                       'lengths': lengths.tolist()}
+    finally:
+        sock.close()
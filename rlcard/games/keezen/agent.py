@@ -1,19 +1,23 @@
 import random
 from copy import copy
 from rlcard.games.keezen.board import Board, FieldType, BoardState
+from rlcard.games.keezen.card import CardState
 from rlcard.games.keezen.cardop import CardOpRun, CardOpSplitTwoMarbles, CardOpStart
-from rlcard.games.keezen.game import GameState, GameActions
-from rlcard.games.keezen.move import Move
+from rlcard.games.keezen.game import GameState
+from rlcard.games.keezen.move import Move, CompactMove
 
 
 class RandomAgent:
-    """Selects a random move."""
-    def __init__(self, game):
+    """Selects a random move. Uses the random generator rng (see Game.create_rng) or the global random generator."""
+    def __init__(self, game, rng=None):
         self.game = game
+        self.rng = rng
 
     def get_move(self, moves: [Move]):
         if not moves:
             return None
+        if self.rng is not None:
+            return moves[self.rng.integers(len(moves))]
         return random.choice(moves)
 
 
@@ -56,6 +60,18 @@ class RuleBasedMoveEvaluator:
         if len(self.field_values) == 0:
             self.field_values = self._get_field_values()
         self.evaluatedMarblePositions = {}
+        # Per card value index: the run fields of the run and split card operations and if it is a starter
+        self.value_run_fields = [[] for _ in range(CardState.NUM_CARD_VALUES)]
+        self.value_path_lengths = [[] for _ in range(CardState.NUM_CARD_VALUES)]
+        self.value_is_starter = [False] * CardState.NUM_CARD_VALUES
+        for card_value, card_ops in {card.card_value: card_ops for card, card_ops in game.card_ops.items()}.items():
+            for card_op in card_ops:
+                if isinstance(card_op, CardOpRun):
+                    self.value_run_fields[card_value - 1].append(card_op.run_fields)
+                if isinstance(card_op, CardOpRun) or isinstance(card_op, CardOpSplitTwoMarbles):
+                    self.value_path_lengths[card_value - 1].append(card_op.run_fields)
+                if isinstance(card_op, CardOpStart):
+                    self.value_is_starter[card_value - 1] = True
 
     def _get_field_values(self) -> {}:
         """Run from start to last home field, giving values to the fields."""
@@ -92,12 +108,12 @@ class RuleBasedMoveEvaluator:
                 evaluation_result_before_move.add(eval_result_hit)
 
             # Move the marble(s)
-            c_game_state = copy(game_state)
-            _ = BoardState.put_marble_on_field(marble_move.marble, marble_move.to_field,
-                                               c_game_state.fields_with_marbles)
+            c_game_state = copy(game_state)  # Copy-on-write, only the fields with marbles are cloned
+            c_fields_with_marbles = c_game_state.get_mutable('fields_with_marbles')
+            _ = BoardState.put_marble_on_field(marble_move.marble, marble_move.to_field, c_fields_with_marbles)
             for hit_marble_move in marble_move.hit_marble_moves:
                 _ = BoardState.put_marble_on_field(hit_marble_move.marble, hit_marble_move.to_field,
-                                                   c_game_state.fields_with_marbles)
+                                                   c_fields_with_marbles)
 
             # Evaluate new position
             evaluation_result_after_move = self.evaluate_marble_position(marble_move.marble, move, c_game_state)
@@ -121,6 +137,14 @@ class RuleBasedMoveEvaluator:
                     result.add(cardOp.run_fields)
         return sorted(result)
 
+    def get_run_path_lengths_for_card_counts(self, card_counts) -> []:
+        """Returns the possible path lengths for the card counts, see get_run_path_lengths_for_cards."""
+        result = set()
+        for value_index in range(CardState.NUM_CARD_VALUES):
+            if card_counts[value_index] > 0:
+                result.update(self.value_path_lengths[value_index])
+        return sorted(result)
+
     @staticmethod
     def get_players_card_count(game_state) -> (int, int, int, int, int):
         """Returns the number of cards of player, opponents and teammate. (own, teammate, opponents, total, stock)"""
@@ -171,30 +195,29 @@ class RuleBasedMoveEvaluator:
             else:
                 return EvaluationResult.PROGRESS_OTHERS
 
-    def risk_card_action_run(self, run_fields, possible_cards) -> float:
-        """Determines the chance that a run card action might be played by other players.
-            Returns a value between 0 and 1."""
-        if len(possible_cards) == 0:
+    def risk_card_action_run(self, run_fields, possible_card_counts) -> float:
+        """Determines the chance that a run card action might be played by other players. The possible cards are
+            given as card counts. Returns a value between 0 and 1."""
+        number_of_cards = int(possible_card_counts.sum())
+        if number_of_cards == 0:
             return 0.0
         number_of_card_actions = 0
-        for card in possible_cards:
-            for cardop in self.game.card_ops[card]:
-                if isinstance(cardop, CardOpRun):
-                    if cardop.run_fields == run_fields:
-                        number_of_card_actions += 1
-        return number_of_card_actions/len(possible_cards)
-
-    def risk_card_action_start(self, possible_cards) -> float:
-        """Determines the chance that a starter cardop might be played by other players.
-            Returns a value between 0 and 1."""
-        if len(possible_cards) == 0:
+        for value_index in range(CardState.NUM_CARD_VALUES):
+            number_of_card_actions += int(possible_card_counts[value_index]) * \
+                self.value_run_fields[value_index].count(run_fields)
+        return number_of_card_actions/number_of_cards
+
+    def risk_card_action_start(self, possible_card_counts) -> float:
+        """Determines the chance that a starter cardop might be played by other players. The possible cards are
+            given as card counts. Returns a value between 0 and 1."""
+        number_of_cards = int(possible_card_counts.sum())
+        if number_of_cards == 0:
             return 0.0
         number_of_card_actions = 0.0
-        for card in possible_cards:
-            for cardop in self.game.card_ops[card]:
-                if isinstance(cardop, CardOpStart):
-                    number_of_card_actions += 1
-        return number_of_card_actions/len(possible_cards)
+        for value_index in range(CardState.NUM_CARD_VALUES):
+            if self.value_is_starter[value_index]:
+                number_of_card_actions += int(possible_card_counts[value_index])
+        return number_of_card_actions/number_of_cards
 
     def evaluate_marble_position(self, marble, move, c_game_state: GameState):  # -> EvaluationResult:
         """Evaluates a marble position.
@@ -216,11 +239,12 @@ class RuleBasedMoveEvaluator:
         else:
             result.values[parameter] = evaluated_value
 
-        unknown_cards = list(c_game_state.stock_cards)
-        for c_player in c_game_state.player_cards.keys():
-            if c_player != c_game_state.move_player:
-                unknown_cards.extend(c_game_state.player_cards[c_player])
-        path_lengths = self.get_run_path_lengths_for_cards(unknown_cards)
+        # Cards in stock and hands of the other players
+        move_player_index = self.game.players.index(c_game_state.move_player)
+        card_counts = c_game_state.card_counts
+        unknown_cards = card_counts[CardState.STOCK_ROW] + card_counts[:len(self.game.players)].sum(axis=0) - \
+            card_counts[move_player_index]
+        path_lengths = self.get_run_path_lengths_for_card_counts(unknown_cards)
         if path_lengths:
             move_player_plays_with_color = c_game_state.players_play_with_color[c_game_state.move_player]
             team_mate_plays_with_color = c_game_state.players_play_with_color[c_game_state.move_player.get_team_mate()]
@@ -286,14 +310,12 @@ class RuleBasedMoveEvaluator:
                 self_blocked = 0.0
                 waiting_marble = self.board.get_waiting_marble(field.color_, c_game_state.fields_with_marbles)
                 if waiting_marble:
-                    for card in c_game_state.player_cards[c_game_state.move_player]:
-                        if card not in move.cards:
-                            card_actions = self.game.card_ops[card]
-                            for cardAction in card_actions:
-                                if isinstance(cardAction, CardOpStart):
-                                    # There is a marble on start and player has a starter
-                                    self_blocked = -50
-                                    break
+                    starters = sum(int(card_counts[move_player_index][value_index]) for value_index
+                                   in range(CardState.NUM_CARD_VALUES) if self.value_is_starter[value_index])
+                    starters -= sum(1 for card in move.cards if self.value_is_starter[card.card_value - 1])
+                    if starters > 0:
+                        # There is a marble on start and player has a starter
+                        self_blocked = -50
                     if self_blocked == 0:
                         # Check if the marble is being blocked by others
                         # Get the path indexes with marbles on it
@@ -373,13 +395,13 @@ class RuleBasedAgentAdapter:
         self.use_raw = False
 
     def eval_step(self, state):
-        allowed_moves = state.get('allowed_moves')
         game_state = state['game_state']
+        allowed_moves = self.rule_based_agent.game.get_moves_from_compact(state.get('compact_moves'), game_state)
         move = self.rule_based_agent.get_move(allowed_moves, game_state)
         if not move:
             return 0, {}
-        raw_action = move.get_raw_action(self.rule_based_agent.game, game_state)
-        action_index = GameActions.ALL_ACTIONS_271.index(raw_action)
+        game = self.rule_based_agent.game
+        action_index = game.action_codec.get_action_index(CompactMove.from_move(move), move.player, game, game_state)
         info = {}
         return action_index, info
 
@@ -0,0 +1,588 @@
+import numpy as np
+
+from rlcard.games.keezen.board import Board, BoardState, FieldType
+from rlcard.games.keezen.card import CardState, CardValue
+from rlcard.games.keezen.cardop import CardOpRun, CardOpStart, CardOpSwitchOneOwnMarble, CardOpSplitTwoMarbles
+from rlcard.games.keezen.game import ActionCodec
+from rlcard.games.keezen.move import MoveType, CompactMove
+
+
+class BatchGame:
+    """A batch of games of Keezen with the whole state in numpy arrays. The moves of all games are generated and
+    applied with array operations at once, for fast tournaments of simple agents, see play.
+    The rules are taken from a Game: the path tables are computed from its Board and the moves from the card
+    operations of its Rules, so Game stays the specification of the rules.
+    Colors, players and cards are indexes: player i plays color i at the start, card value v has index v - 1.
+    The state of game b: marble_fields[b] (field id per marble id), field_marbles[b] (marble id per field id,
+    NO_MARBLE if empty), hand_counts[b] (number of cards per player and card value, the suits do not matter for the
+    rules), stock[b] (card value indexes, the last of stock_sizes[b] is dealt first), played_counts[b],
+    plays_with_color[b] (color per player), move_player[b], deal_player[b], round_number[b] and move_number[b].
+    The moves are fixed slots: a slot has a move type and card value and 1 or 2 marble moves, for example RUN with an
+    ACE with the third marble of the color the player plays with. get_legal_moves returns the legal slots per game and
+    keeps per marble move, game and slot the moving marble, its destination field and the marble it hits.
+    Paths are checked with bitmasks: the start and home fields, the only fields a marble can block, have a bit. Per
+    color, field and run fields the path table has the bits of the fields that could block the path and a NO_PATH bit
+    if the board has no path. The path is free if it has no bits in common with the blocked fields of the game."""
+    MAX_STEPS = 12  # Max number of fields of a run, the path tables have run fields -MAX_STEPS..MAX_STEPS
+    NO_MARBLE = -1
+    NO_PATH = 1 << 62  # Path bit that is always blocked
+    PASS_CODE = ActionCodec.MOVE_TYPE_CODES["NO"]
+    MOVE_TYPES = {code: move_type for move_type, code in ActionCodec.COMPACT_MOVE_TYPE_CODES.items()}
+
+    def __init__(self, game, num_games, rng=None):
+        """Creates num_games games with the rules, players and board of game. The cards are shuffled with the numpy
+        random generator rng, see Game.create_rng."""
+        self.rules = game.rules
+        self.num_games = num_games
+        self.rng = rng if rng is not None else np.random.default_rng()
+        players = game.players
+        self.num_players = len(players)
+        self.next_players = np.array([players.index(player.get_next_player(players)) for player in players])
+        self.team_mates = np.array([players.index(player.get_team_mate()) for player in players])
+        self.cards_per_round = np.array(self.rules.cards_per_round)
+        self.deck = np.array([card.card_value.value - 1 for card in game.cards], dtype=np.int8)
+        self._create_board_tables(game.board, players)
+        self._create_slots(game)
+
+        shape = (num_games,)
+        self.marble_fields = np.zeros(shape + (len(game.board.marbles),), dtype=np.int16)
+        self.field_marbles = np.full(shape + (self.no_field + 1,), BatchGame.NO_MARBLE, dtype=np.int8)
+        self.hand_counts = np.zeros(shape + (self.num_players, CardState.NUM_CARD_VALUES), dtype=np.int8)
+        self.played_counts = np.zeros(shape + (CardState.NUM_CARD_VALUES,), dtype=np.int8)
+        self.stock = np.zeros(shape + (len(self.deck),), dtype=np.int8)
+        self.stock_sizes = np.zeros(shape, dtype=np.int16)
+        self.plays_with_color = np.zeros(shape + (self.num_players,), dtype=np.int8)
+        self.move_player = np.zeros(shape, dtype=np.int8)
+        self.deal_player = np.zeros(shape, dtype=np.int8)
+        self.round_number = np.zeros(shape, dtype=np.int32)
+        self.move_number = np.zeros(shape, dtype=np.int32)
+        self.done = np.zeros(shape, dtype=bool)
+        self.rewards = np.zeros(shape + (self.num_players,), dtype=np.int8)
+        # Legal moves of the last get_legal_moves: [marble move, game, slot], NO_MARBLE if a slot has 1 marble move
+        self.legal = np.zeros(shape + (self.num_slots,), dtype=bool)
+        self.move_marbles = np.full((2,) + self.legal.shape, BatchGame.NO_MARBLE, dtype=np.int8)
+        self.move_to_fields = np.full((2,) + self.legal.shape, self.no_field, dtype=np.int16)
+        self.move_hit_marbles = np.full((2,) + self.legal.shape, BatchGame.NO_MARBLE, dtype=np.int8)
+        self._rows = np.arange(num_games)
+        self._set_fixed_moves()
+        self.reset()
+
+    def _create_board_tables(self, board, players):
+        """Creates the field, marble and path tables from the board. The extra field no_field is never occupied."""
+        self.no_field = len(board.fields)
+        size = self.no_field + 1
+        color_indexes = {player.player_color: i for i, player in enumerate(players)}
+        self.field_colors = np.full(size, -1, dtype=np.int8)
+        self.is_wait_field = np.zeros(size, dtype=bool)
+        self.is_home_field = np.zeros(size, dtype=bool)
+        self.is_start_field = np.zeros(size, dtype=bool)
+        for field in board.fields:
+            self.field_colors[field.id_] = color_indexes.get(field.color_, -1)
+            self.is_wait_field[field.id_] = field.type_ == FieldType.WAIT
+            self.is_home_field[field.id_] = field.type_ == FieldType.HOME
+            self.is_start_field[field.id_] = field.type_ == FieldType.START
+        # A marble on a start or home field of its color blocks, see Board.get_path_for_color
+        self.blocking_fields = np.flatnonzero(self.is_start_field | self.is_home_field)
+        if len(self.blocking_fields) >= 62:
+            raise ValueError("Too many start and home fields for the path bitmasks.")
+        self.field_bits = np.zeros(size, dtype=np.int64)
+        self.field_bits[self.blocking_fields] = 1 << np.arange(len(self.blocking_fields), dtype=np.int64)
+        # Marble id -> color, the extra last entry is the color of NO_MARBLE
+        self.marble_colors = np.array([color_indexes[marble.color_] for marble in board.marbles] + [-1],
+                                      dtype=np.int8)
+        self.color_marbles = np.array([[marble.id_ for marble in board.get_marbles_with_color(player.player_color)]
+                                       for player in players], dtype=np.intp)
+        self.wait_fields = np.array([[field.id_ for field in board.waitFields if field.color_ == player.player_color]
+                                     for player in players], dtype=np.intp)
+        self.initial_marble_fields = np.zeros(len(board.marbles), dtype=np.int16)  # Marble k of a color: wait field k
+        self.initial_marble_fields[self.color_marbles] = self.wait_fields
+        self.start_fields = np.array([board.get_start_field_with_color(player.player_color).id_
+                                      for player in players], dtype=np.intp)
+        self.next_home_fields = np.full((len(players), size), self.no_field, dtype=np.intp)
+        self.path_progress = np.full((len(players), size), -1, dtype=np.int16)
+        steps = 2 * BatchGame.MAX_STEPS + 1
+        self.path_bits = np.full((len(players), size, steps), BatchGame.NO_PATH, dtype=np.int64)
+        self.path_to_fields = np.full((len(players), size, steps), self.no_field, dtype=np.int16)
+        for color_index, player in enumerate(players):
+            self.path_progress[color_index, BoardState.PATH_FOR_LOCATION[color_index]] = \
+                np.arange(len(BoardState.PATH_FOR_LOCATION[color_index]))
+            for field in board.fields:
+                for next_field in field.next_fields:
+                    if next_field.type_ == FieldType.HOME and next_field.color_ == player.player_color:
+                        self.next_home_fields[color_index, field.id_] = next_field.id_
+                for run_fields in range(-BatchGame.MAX_STEPS, BatchGame.MAX_STEPS + 1):
+                    path, blocking_indexes, _ = Board.get_path_table_entry(player.player_color, field, run_fields)
+                    if run_fields and len(path) == abs(run_fields):
+                        entry = (color_index, field.id_, run_fields + BatchGame.MAX_STEPS)
+                        self.path_bits[entry] = np.bitwise_or.reduce(
+                            self.field_bits[[path[index].id_ for index in blocking_indexes]], initial=0)
+                        self.path_to_fields[entry] = path[-1].id_
+
+    def _create_slots(self, game):
+        """Creates the move slots from the card operations of the rules, per card value."""
+        move_types = []
+        card_values = []
+
+        def add_slots(move_type, card_value, count):
+            move_types.extend([ActionCodec.COMPACT_MOVE_TYPE_CODES[move_type]] * count)
+            card_values.extend([card_value] * count)
+            return len(move_types) - count
+
+        self.run_slots = []  # (first slot, card value, run fields): a slot per own marble
+        self.start_slots = []  # (slot, card value)
+        self.switch_slots = []  # (first slot, card value): a slot per own marble and marble
+        self.split_slots = []  # (first slot, card value): see _set_split_moves
+        num_marbles = len(self.marble_colors) - 1
+        cards = {}
+        for card in game.cards:
+            cards.setdefault(card.card_value.value, card)
+        for card_value, card in sorted(cards.items()):
+            for card_op in game.card_ops[card]:
+                if isinstance(card_op, CardOpRun):
+                    self.run_slots.append((add_slots(MoveType.RUN, card_value, 4), card_value, card_op.run_fields))
+                elif isinstance(card_op, CardOpStart):
+                    self.start_slots.append((add_slots(MoveType.START, card_value, 1), card_value))
+                elif isinstance(card_op, CardOpSwitchOneOwnMarble):
+                    self.switch_slots.append((add_slots(MoveType.SWITCH, card_value, 4 * num_marbles), card_value))
+                elif isinstance(card_op, CardOpSplitTwoMarbles):
+                    self.split_slots.append((add_slots(MoveType.SPLIT, card_value, 4 + 4 * 6 * 4 + 4), card_value))
+                else:
+                    raise ValueError("Card operation {0} is not supported.".format(type(card_op).__name__))
+        self.num_card_slots = len(move_types)
+        self.throw_cards_slot = add_slots(MoveType.THROW_CARDS, 0, 1)
+        self.deal_slot = add_slots(MoveType.DEAL, 0, 1)
+        move_types.append(BatchGame.PASS_CODE)
+        card_values.append(0)
+        self.pass_slot = len(move_types) - 1
+        self.num_slots = len(move_types)
+        self.slot_move_types = np.array(move_types, dtype=np.int8)
+        self.slot_card_values = np.array(card_values, dtype=np.int8)
+
+    def reset(self, rows=None):
+        """Starts new games in the rows (all rows if None): all marbles at wait fields, cards shuffled and dealt."""
+        rows = self._rows if rows is None else np.asarray(rows)
+        self.marble_fields[rows] = self.initial_marble_fields
+        self.field_marbles[rows] = BatchGame.NO_MARBLE
+        self.field_marbles[rows[:, None], self.initial_marble_fields] = np.arange(len(self.initial_marble_fields))
+        self.hand_counts[rows] = 0
+        self.played_counts[rows] = 0
+        self.stock[rows] = self.rng.permuted(np.broadcast_to(self.deck, (len(rows), len(self.deck))), axis=1)
+        self.stock_sizes[rows] = len(self.deck)
+        self.plays_with_color[rows] = np.arange(self.num_players)
+        self.deal_player[rows] = self.rules.player_start
+        self.move_player[rows] = self.next_players[self.rules.player_start]
+        self.round_number[rows] = 0
+        self.move_number[rows] = 0
+        self.done[rows] = False
+        self.rewards[rows] = 0
+        self._deal_cards(rows)
+
+    def _deal_cards(self, rows):
+        """Deals the cards of the round to the players of the rows, starting with the player after the dealer."""
+        number_of_cards = self.cards_per_round[self.round_number[rows] % len(self.cards_per_round)]
+        player = self.next_players[self.deal_player[rows]]
+        for card_number in range(number_of_cards.max(initial=0)):
+            dealing = card_number < number_of_cards
+            deal_rows = rows[dealing]
+            for _ in range(self.num_players):
+                self.stock_sizes[deal_rows] -= 1
+                card_indexes = self.stock[deal_rows, self.stock_sizes[deal_rows]]
+                self.hand_counts[deal_rows, player[dealing], card_indexes] += 1
+                player = self.next_players[player]
+
+    def _get_blocked_bits(self):
+        """Returns per game the bits of the blocked fields: start and home fields with a marble of their color."""
+        marble_colors = self.marble_colors[self.field_marbles[:, self.blocking_fields]]
+        blocked = marble_colors == self.field_colors[self.blocking_fields]
+        return (blocked * self.field_bits[self.blocking_fields]).sum(axis=1) | BatchGame.NO_PATH
+
+    def _move_blocked_bits(self, blocked, from_fields, to_fields, colors):
+        """Returns the blocked bits after a marble of the color moved per game from from_fields to to_fields."""
+        to_bits = self.field_bits[to_fields]
+        return blocked & ~self.field_bits[from_fields] & ~to_bits | \
+            np.where(self.field_colors[to_fields] == colors, to_bits, 0)
+
+    def _set_moves(self, move_index, slots, marbles, to_fields, hit_marbles=None):
+        """Sets a marble move of the slots for all games. Parts that do not change are set by _set_fixed_moves."""
+        self.move_marbles[move_index][:, slots] = marbles
+        self.move_to_fields[move_index][:, slots] = to_fields
+        if hit_marbles is not None:
+            self.move_hit_marbles[move_index][:, slots] = hit_marbles
+
+    def _set_fixed_moves(self):
+        """Sets the parts of the marble moves that are the same for all positions: no second marble move for runs,
+        starts and 7 field splits, the other marble of a switch, and no hits for switches and team mate finishes."""
+        num_marbles = self.marble_fields.shape[1]
+        for first_slot, _ in self.switch_slots:
+            slots = slice(first_slot, first_slot + 4 * num_marbles)
+            self.move_marbles[1][:, slots] = np.tile(np.arange(num_marbles), 4)
+            self.move_hit_marbles[:, :, slots] = BatchGame.NO_MARBLE
+        for first_slot, _ in self.split_slots:
+            self.move_hit_marbles[0][:, first_slot + 100:first_slot + 104] = BatchGame.NO_MARBLE
+
+    def get_legal_moves(self):
+        """Returns the legal slots as [games, slots] bool array, see get_allowed_compact_moves of Game. Finished
+        games only have the pass slot. The marble moves of the slots are kept for step."""
+        rows = self._rows
+        players = self.move_player
+        colors = self.plays_with_color[rows, players]
+        own_marbles = self.color_marbles[colors]
+        own_fields = self.marble_fields[rows[:, None], own_marbles]
+        hands = self.hand_counts[rows, players] > 0
+        blocked = self._get_blocked_bits()
+        # Per own marble and run fields: is the path free and its last field
+        own_paths = (self.path_bits[colors[:, None], own_fields] & blocked[:, None, None]) == 0
+        own_to_fields = self.path_to_fields[colors[:, None], own_fields]
+        legal = self.legal
+        legal[:] = False
+        for first_slot, card_value, run_fields in self.run_slots:
+            slots = slice(first_slot, first_slot + 4)
+            to_fields = own_to_fields[:, :, run_fields + BatchGame.MAX_STEPS]
+            legal[:, slots] = hands[:, card_value - 1, None] & own_paths[:, :, run_fields + BatchGame.MAX_STEPS]
+            self._set_moves(0, slots, own_marbles, to_fields, self.field_marbles[rows[:, None], to_fields])
+        for slot, card_value in self.start_slots:
+            start_fields = self.start_fields[colors]
+            marble_on_start = self.field_marbles[rows, start_fields]
+            waiting = self.is_wait_field[own_fields]
+            legal[:, slot] = hands[:, card_value - 1] & (self.marble_colors[marble_on_start] != colors) & \
+                waiting.any(axis=1)
+            self._set_moves(0, slot, own_marbles[rows, waiting.argmax(axis=1)], start_fields, marble_on_start)
+        if self.switch_slots:
+            not_switchable = self.is_wait_field | self.is_home_field
+            switchable = ~not_switchable[self.marble_fields] & \
+                ~(self.is_start_field[self.marble_fields] &
+                  (self.field_colors[self.marble_fields] == self.marble_colors[:-1]))
+            other_switchable = switchable & (self.marble_colors[:-1] != colors[:, None])
+            own_switchable = ~not_switchable[own_fields]
+            num_marbles = self.marble_fields.shape[1]
+            for first_slot, card_value in self.switch_slots:
+                slots = slice(first_slot, first_slot + 4 * num_marbles)
+                legal[:, slots] = (hands[:, card_value - 1, None, None] & own_switchable[:, :, None] &
+                                   other_switchable[:, None, :]).reshape(self.num_games, -1)
+                self._set_moves(0, slots, np.repeat(own_marbles, num_marbles, axis=1), np.tile(self.marble_fields, 4))
+                self.move_to_fields[1][:, slots] = np.repeat(own_fields, num_marbles, axis=1)
+        for first_slot, card_value in self.split_slots:
+            self._set_split_moves(first_slot, hands[:, card_value - 1], players, colors, own_marbles, own_fields,
+                                  blocked, own_paths, own_to_fields)
+        has_cards = hands.any(axis=1)
+        round_over = ~self.hand_counts.reshape(self.num_games, -1).any(axis=1)
+        legal[:, self.throw_cards_slot] = has_cards & ~legal[:, :self.num_card_slots].any(axis=1)
+        legal[:, self.deal_slot] = round_over & ~self.done
+        legal[self.done] = False
+        legal[:, self.pass_slot] = ~legal.any(axis=1)
+        return legal
+
+    def _set_split_moves(self, first_slot, has_card, players, colors, own_marbles, own_fields, blocked, own_paths,
+                         own_to_fields):
+        """Sets the legal moves of a split card, see CardOpSplitTwoMarbles. Slots from first_slot: 4 slots that run
+        7 fields with an own marble, 4 x 6 x 4 slots that run 1..6 fields with an own marble and the rest with another
+        own marble, 4 slots that finish the last own marble and run the rest with a team mate marble."""
+        rows = self._rows
+        legal = self.legal
+        steps = BatchGame.MAX_STEPS
+        slots = slice(first_slot, first_slot + 4)
+        legal[:, slots] = has_card[:, None] & own_paths[:, :, 7 + steps]
+        to_fields = own_to_fields[:, :, 7 + steps]
+        self._set_moves(0, slots, own_marbles, to_fields, self.field_marbles[rows[:, None], to_fields])
+        # Length of the path that stops before a blocked field, for run fields 1..MAX_STEPS: a path of n fields is
+        # the start of the path of n + 1 fields, so the number of free paths is the length
+        free_paths = np.cumsum(own_paths[:, :, steps + 1:], axis=2)
+        marble_indexes = np.arange(4)
+        for length in range(4, 7):
+            to_fields = own_to_fields[:, :, length + steps]
+            hit_marbles = self.field_marbles[rows[:, None], to_fields]
+            for marble_index in range(4):
+                marble = own_marbles[:, marble_index]
+                from_field = own_fields[:, marble_index]
+                to_field = to_fields[:, marble_index]
+                # Run the marble, then another own marble that is not hit with the rest
+                blocked2 = self._move_blocked_bits(blocked, from_field, to_field, colors)
+                to_fields2 = own_to_fields[:, :, 7 - length + steps]
+                slots = slice(first_slot + 4 + (marble_index * 6 + length - 1) * 4,
+                              first_slot + 4 + (marble_index * 6 + length) * 4)
+                legal[:, slots] = (has_card & own_paths[:, marble_index, length + steps])[:, None] & \
+                    ((self.path_bits[colors[:, None], own_fields, 7 - length + steps] & blocked2[:, None]) == 0) & \
+                    (marble_indexes != marble_index) & (own_marbles != hit_marbles[:, marble_index, None])
+                self._set_moves(0, slots, marble[:, None], to_field[:, None], hit_marbles[:, marble_index, None])
+                self._set_moves(1, slots, own_marbles, to_fields2,
+                                self._get_marbles_after_move(to_fields2, from_field, to_field, marble))
+                # Shorter path: an own marble on the next home field might block, run that marble first
+                shorter_length = free_paths[:, marble_index, length - 1]
+                last_field = np.where(shorter_length > 0, own_to_fields[rows, marble_index, shorter_length + steps],
+                                      from_field)
+                blocking_marble = self.field_marbles[rows, self.next_home_fields[colors, last_field]]
+                first = has_card & (shorter_length < length) & (blocking_marble != BatchGame.NO_MARBLE)
+                if not first.any():
+                    continue
+                first_rows = rows[first]
+                first_colors = colors[first]
+                blocking_marble = blocking_marble[first]
+                blocking_from_field = self.marble_fields[first_rows, blocking_marble]
+                blocking_to_field = self.path_to_fields[first_colors, blocking_from_field, 7 - length + steps]
+                blocked3 = self._move_blocked_bits(blocked[first], blocking_from_field, blocking_to_field,
+                                                   first_colors)
+                first_to_field = own_to_fields[first_rows, marble_index, length + steps]
+                ok = ((self.path_bits[first_colors, blocking_from_field, 7 - length + steps] & blocked[first]) == 0) & \
+                    ((self.path_bits[first_colors, from_field[first], length + steps] & blocked3) == 0)
+                first_rows = first_rows[ok]
+                slots = first_slot + 4 + ((blocking_marble - first_colors * 4) * 6 + 6 - length)[ok] * 4 + \
+                    marble_index
+                legal[first_rows, slots] = True
+                self.move_marbles[:, first_rows, slots] = (blocking_marble[ok], marble[first_rows])
+                self.move_to_fields[:, first_rows, slots] = (blocking_to_field[ok], first_to_field[ok])
+                self.move_hit_marbles[:, first_rows, slots] = (
+                    self.field_marbles[first_rows, blocking_to_field[ok]],
+                    self._get_marbles_after_move(first_to_field[ok], blocking_from_field[ok], blocking_to_field[ok],
+                                                 blocking_marble[ok], first_rows))
+        # No split moves: finish the last own marble and continue with the marbles of the team mate
+        at_home = self.is_home_field[own_fields]
+        finishing = has_card & ~legal[:, first_slot:first_slot + 100].any(axis=1) & (colors == players) & \
+            (at_home.sum(axis=1) == 3) & ~(at_home & (free_paths[:, :, 2] > 0)).any(axis=1)
+        last_index = (~at_home).argmax(axis=1)
+        last_length = free_paths[rows, last_index, 5]
+        last_to_field = own_to_fields[rows, last_index, last_length + steps]
+        finishing &= (last_length > 0) & self.is_home_field[last_to_field]
+        team_mate_colors = self.team_mates[players]
+        team_mate_marbles = self.color_marbles[team_mate_colors]
+        team_mate_fields = self.marble_fields[rows[:, None], team_mate_marbles]
+        run_fields = 7 - last_length[:, None] + steps
+        to_fields = self.path_to_fields[team_mate_colors[:, None], team_mate_fields, run_fields]
+        slots = slice(first_slot + 100, first_slot + 104)
+        legal[:, slots] = finishing[:, None] & \
+            ((self.path_bits[team_mate_colors[:, None], team_mate_fields, run_fields] & blocked[:, None]) == 0)
+        self._set_moves(0, slots, own_marbles[rows, last_index, None], last_to_field[:, None])
+        self._set_moves(1, slots, team_mate_marbles, to_fields, self.field_marbles[rows[:, None], to_fields])
+
+    def _get_marbles_after_move(self, fields, from_field, to_field, marble, rows=None):
+        """Returns the marbles on the fields after the marble moved from from_field to to_field, per game."""
+        if rows is None:
+            rows = self._rows
+        if np.ndim(fields) == 2:
+            from_field, to_field, marble, rows = from_field[:, None], to_field[:, None], marble[:, None], rows[:, None]
+        return np.where(fields == from_field, BatchGame.NO_MARBLE,
+                        np.where(fields == to_field, marble, self.field_marbles[rows, fields]))
+
+    def step(self, slots):
+        """Does the move of the slot per game, from the legal moves of the last get_legal_moves. Finished games are
+        skipped. Returns the rewards and if the games are done, see Game.step."""
+        rows = self._rows[~self.done]
+        slots = np.asarray(slots)[rows]
+        move_types = self.slot_move_types[slots]
+        players = self.move_player[rows]
+        card_indexes = self.slot_card_values[slots].astype(np.intp) - 1
+        playing = card_indexes >= 0
+        play_rows = rows[playing]
+        self.hand_counts[play_rows, players[playing], card_indexes[playing]] -= 1
+        self.played_counts[play_rows, card_indexes[playing]] += 1
+        throwing = move_types == ActionCodec.COMPACT_MOVE_TYPE_CODES[MoveType.THROW_CARDS]
+        throw_rows = rows[throwing]
+        self.played_counts[throw_rows] += self.hand_counts[throw_rows, players[throwing]]
+        self.hand_counts[throw_rows, players[throwing]] = 0
+        for move_index in range(2):
+            marbles = self.move_marbles[move_index, rows, slots]
+            moving = playing & (marbles != BatchGame.NO_MARBLE)
+            self._move_marbles(rows[moving], marbles[moving], self.move_to_fields[move_index, rows, slots][moving])
+            hit_marbles = self.move_hit_marbles[move_index, rows, slots]
+            hit = playing & (hit_marbles != BatchGame.NO_MARBLE)
+            self._move_marbles_to_wait(rows[hit], hit_marbles[hit])
+        moved = playing | throwing
+        if self.rules.switch_color:
+            move_rows = rows[moved]
+            move_players = players[moved]
+            team_mates = self.team_mates[move_players]
+            switching = self._is_color_finished(move_rows, move_players) & \
+                ~self._is_color_finished(move_rows, team_mates) & \
+                (self.plays_with_color[move_rows, move_players] == move_players)
+            self.plays_with_color[move_rows[switching], move_players[switching]] = team_mates[switching]
+        self.move_number[rows[moved]] += 1
+        dealing = move_types == ActionCodec.COMPACT_MOVE_TYPE_CODES[MoveType.DEAL]
+        if dealing.any():
+            self._deal_round(rows[dealing])
+
+        finished = self._is_color_finished(rows, self.plays_with_color[rows, players])
+        if self.rules.switch_color:
+            team_mates = self.team_mates[players]
+            finished &= self._is_color_finished(rows, self.plays_with_color[rows, team_mates])
+            self.rewards[rows[finished], team_mates[finished]] = 1
+        self.rewards[rows[finished], players[finished]] = 1
+        self.done[rows[finished]] = True
+        dealt = rows[dealing & ~finished]
+        self.move_player[dealt] = self.next_players[self.deal_player[dealt]]
+        self.move_player[rows[~dealing & ~finished]] = self.next_players[players[~dealing & ~finished]]
+        return self.rewards, self.done
+
+    def _move_marbles(self, rows, marbles, to_fields):
+        """Puts the marbles on the fields, one marble per game. The fields are left by the marbles."""
+        from_fields = self.marble_fields[rows, marbles]
+        leaving = self.field_marbles[rows, from_fields] == marbles
+        self.field_marbles[rows[leaving], from_fields[leaving]] = BatchGame.NO_MARBLE
+        self.field_marbles[rows, to_fields] = marbles
+        self.marble_fields[rows, marbles] = to_fields
+
+    def _move_marbles_to_wait(self, rows, marbles):
+        """Puts hit marbles on the first empty wait field of their color, one marble per game."""
+        wait_fields = self.wait_fields[self.marble_colors[marbles]]
+        empty = self.field_marbles[rows[:, None], wait_fields] == BatchGame.NO_MARBLE
+        self._move_marbles(rows, marbles, wait_fields[np.arange(len(rows)), empty.argmax(axis=1)])
+
+    def _is_color_finished(self, rows, colors):
+        """Returns per game if the marbles of the color are finished, see Board.is_color_finished."""
+        at_home = self.is_home_field[self.marble_fields[rows[:, None], self.color_marbles[colors]]]
+        return at_home.sum(axis=1) == self.rules.finish_marble_nrs
+
+    def _deal_round(self, rows):
+        """Deals the next round, the stock is shuffled again when it is empty. See the DEAL move of Game."""
+        self.round_number[rows] += 1
+        reset_rows = rows[self.stock_sizes[rows] == 0]
+        if len(reset_rows):
+            self.stock[reset_rows] = self.rng.permuted(np.broadcast_to(self.deck, (len(reset_rows), len(self.deck))),
+                                                       axis=1)
+            self.stock_sizes[reset_rows] = len(self.deck)
+            self.played_counts[reset_rows] = 0
+        rotating = rows if self.rules.rotate_dealer_each_round else reset_rows
+        self.deal_player[rotating] = self.next_players[self.deal_player[rotating]]
+        self._deal_cards(rows)
+
+    def set_game_state(self, row, game, game_state):
+        """Sets the game in the row to the game state of game, for example to compare with Game."""
+        players = game.players
+        self.marble_fields[row] = [field.id_ for field in game_state.fields_with_marbles.marble_fields]
+        self.field_marbles[row] = BatchGame.NO_MARBLE
+        self.field_marbles[row, self.marble_fields[row]] = np.arange(self.marble_fields.shape[1])
+        self.hand_counts[row] = game_state.card_counts[:self.num_players]
+        self.played_counts[row] = game_state.card_counts[CardState.PLAYED_ROW]
+        self.stock_sizes[row] = len(game_state.stock_cards)
+        self.stock[row, :len(game_state.stock_cards)] = [card.card_value.value - 1
+                                                         for card in game_state.stock_cards]
+        color_indexes = {player.player_color: i for i, player in enumerate(players)}
+        self.plays_with_color[row] = [color_indexes[game_state.players_play_with_color[player]]
+                                      for player in players]
+        self.move_player[row] = players.index(game_state.move_player)
+        self.deal_player[row] = players.index(game_state.deal_player)
+        self.round_number[row] = game_state.round_number
+        self.move_number[row] = game_state.move_number
+        done, rewards = game.is_over(game_state)
+        self.done[row] = done
+        self.rewards[row] = rewards if done else 0
+
+    def get_compact_moves(self, row, slots):
+        """Returns the compact moves of the slots of the game in the row, see CompactMove. Uses the marble moves of
+        the last get_legal_moves."""
+        compact_moves = []
+        for slot in slots:
+            move_type_code = self.slot_move_types[slot]
+            if move_type_code == BatchGame.PASS_CODE:
+                continue
+            move_type = BatchGame.MOVE_TYPES[move_type_code]
+            if move_type == MoveType.THROW_CARDS:
+                compact_moves.append(CompactMove.THROW_CARDS)
+                continue
+            if move_type == MoveType.DEAL:
+                compact_moves.append(CompactMove.DEAL)
+                continue
+            marble_fields = self.marble_fields[row].copy()
+            field_marbles = self.field_marbles[row].copy()
+            compact_marble_moves = []
+            for move_index in range(2):
+                marble = int(self.move_marbles[move_index, row, slot])
+                if marble == BatchGame.NO_MARBLE:
+                    continue
+                from_field = int(marble_fields[marble])
+                to_field = int(self.move_to_fields[move_index, row, slot])
+                hit_marble = int(self.move_hit_marbles[move_index, row, slot])
+                run_fields = self._get_run_fields(move_type, slot, marble, from_field, to_field)
+                if field_marbles[from_field] == marble:
+                    field_marbles[from_field] = BatchGame.NO_MARBLE
+                field_marbles[to_field] = marble
+                marble_fields[marble] = to_field
+                hit_field = CompactMove.NO_HIT
+                if hit_marble != BatchGame.NO_MARBLE:
+                    wait_fields = self.wait_fields[self.marble_colors[hit_marble]]
+                    hit_field = int(wait_fields[np.argmax(field_marbles[wait_fields] == BatchGame.NO_MARBLE)])
+                    if field_marbles[marble_fields[hit_marble]] == hit_marble:
+                        field_marbles[marble_fields[hit_marble]] = BatchGame.NO_MARBLE
+                    field_marbles[hit_field] = hit_marble
+                    marble_fields[hit_marble] = hit_field
+                compact_marble_moves.append((marble, from_field, to_field, run_fields, hit_marble, hit_field))
+            card_value = CardValue(int(self.slot_card_values[slot]))
+            compact_moves.append((move_type, card_value, tuple(compact_marble_moves)))
+        return compact_moves
+
+    def _get_run_fields(self, move_type, slot, marble, from_field, to_field) -> int:
+        """Returns the run fields of a marble move: the run fields of the card or the length of a split path."""
+        if move_type == MoveType.RUN:
+            return next(run_fields for first_slot, _, run_fields in self.run_slots
+                        if first_slot <= slot < first_slot + 4)
+        if move_type == MoveType.SPLIT:
+            color = self.marble_colors[marble]
+            return next(run_fields for run_fields in range(1, 8)
+                        if self.path_to_fields[color, from_field, run_fields + BatchGame.MAX_STEPS] == to_field)
+        return 0
+
+    def play(self, agents, num_games):
+        """Plays num_games games in the rows of the batch, finished games are replaced by new games. The agents are
+        the batch agents per player, see BatchRandomAgent. Returns the payoffs [num_games, players] and the number of
+        moves [num_games] of the games."""
+        payoffs = []
+        lengths = []
+        self.reset()
+        active = self._rows < num_games
+        self.done[~active] = True
+        started = int(active.sum())
+        num_moves = np.zeros(self.num_games, dtype=np.int32)
+        while active.any():
+            legal = self.get_legal_moves()
+            slots = np.full(self.num_games, self.pass_slot)
+            for player, agent in enumerate(agents):
+                playing = self.move_player == player
+                slots[playing] = agent.get_actions(self, legal)[playing]
+            num_moves[~self.done] += 1
+            _, done = self.step(slots)
+            finished = self._rows[active & done]
+            payoffs.extend(self.rewards[finished].tolist())
+            lengths.extend(num_moves[finished].tolist())
+            active[finished] = False
+            restarting = finished[:max(0, num_games - started)]
+            if len(restarting):
+                self.reset(restarting)
+                active[restarting] = True
+                num_moves[restarting] = 0
+                started += len(restarting)
+        return np.array(payoffs, dtype=np.int8).reshape(-1, self.num_players), np.array(lengths)
+
+
+class BatchRandomAgent:
+    """Selects a random legal move per game of a BatchGame."""
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def get_actions(self, batch_game, legal):
+        """Returns a legal slot per game."""
+        return (self.rng.random(legal.shape) * legal).argmax(axis=1)
+
+
+class BatchProgressAgent(BatchRandomAgent):
+    """Scripted agent for a BatchGame: selects the legal move that adds most progress on the path to home to the
+    marbles of its team minus the progress it adds to the other marbles. A hit marble loses its progress. Ties are
+    broken randomly."""
+
+    def get_actions(self, batch_game, legal):
+        """Returns a legal slot per game."""
+        marbles = batch_game.move_marbles
+        to_fields = batch_game.move_to_fields
+        hit_marbles = batch_game.move_hit_marbles
+        from_fields = batch_game.marble_fields[batch_game._rows[:, None], marbles]
+        colors = batch_game.marble_colors[marbles]
+        hit_colors = batch_game.marble_colors[hit_marbles]
+        progress = batch_game.path_progress
+        gains = np.where(marbles != BatchGame.NO_MARBLE, progress[colors, to_fields] - progress[colors, from_fields], 0)
+        losses = np.where(hit_marbles != BatchGame.NO_MARBLE,
+                          progress[hit_colors, to_fields] - progress[hit_colors, batch_game.wait_fields[hit_colors, 0]],
+                          0)
+        players = batch_game.move_player[:, None]
+        team_mates = batch_game.team_mates[batch_game.move_player][:, None]
+        team_signs = np.where((colors == players) | (colors == team_mates), 1, -1)
+        hit_team_signs = np.where((hit_colors == players) | (hit_colors == team_mates), 1, -1)
+        score = (gains * team_signs - losses * hit_team_signs).sum(axis=0) + self.rng.random(legal.shape)
+        return np.where(legal, score, -np.inf).argmax(axis=1)
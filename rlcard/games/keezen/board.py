@@ -1,5 +1,6 @@
 from typing import List
 from rlcard.games.keezen.player import Player
+from rlcard.games.keezen.zobrist import Zobrist
 import numpy as np
 
 
@@ -31,6 +32,7 @@ class Board:
         self.startFields = []
         self.homeFields = []
         self.marbles = []
+        self.home_masks = {}  # Color -> bitmask of the home fields of that color
         self.create_fields(players)
         self.create_marbles(players, 4)
 
@@ -40,6 +42,8 @@ class Board:
             for i in range(24):
                 if i in range(0, 4):
                     home_field = Field(field_id, FieldType.HOME, a_player.player_color)
+                    self.home_masks[a_player.player_color] = self.home_masks.get(a_player.player_color, 0) | \
+                        home_field.mask
                     self.homeFields.append(home_field)
                     self.fields.append(home_field)
                 elif i == 5:
@@ -86,9 +90,15 @@ class Board:
     def create_marbles(self, players, number_of_marbles_per_player):  # [Marble]:
         """Creates the marbles for each player without putting them on wait fields at the board."""
         marble_id = 0
-        for player in players:
+        for player_index, player in enumerate(players):
+            path_indexes = [-1] * len(self.fields)  # Field id -> index in the path of the color
+            for path_index, field_id in enumerate(BoardState.PATH_FOR_LOCATION[player_index]):
+                path_indexes[field_id] = path_index
+            color_marble_ids = tuple(range(marble_id, marble_id + number_of_marbles_per_player))
             for i in range(0, number_of_marbles_per_player):  # 0..< numberOfMarblesPerPlayer:
                 marble = Marble(marble_id, player.player_color, str(i))  # player.location + str(i))
+                marble.path_indexes = path_indexes
+                marble.color_marble_ids = color_marble_ids
                 self.marbles.append(marble)
                 marble_id += 1
 
@@ -118,6 +128,9 @@ class Board:
                 and BoardState.get_field_for_marble(marble, fields_with_marbles).type_ == FieldType.WAIT]
 
     def is_color_finished(self, color, fields_with_marbles, rules) -> bool:
+        if isinstance(fields_with_marbles, FieldsWithMarbles):
+            home_marbles_mask = fields_with_marbles.color_masks.get(color, 0) & self.home_masks[color]
+            return bin(home_marbles_mask).count("1") == rules.finish_marble_nrs
         home_marbles = self.get_marbles_at_home(color, fields_with_marbles)
         return len(home_marbles) == rules.finish_marble_nrs  # Was 4, smaller to shorten game
 
@@ -136,22 +149,59 @@ class Board:
     @staticmethod
     def get_path_for_color(marble_color, current_field, run_fields: int, fields_with_marbles, get_shorter_path=False):
         """Returns a path for a marble if it exists. Assumed is that for Keezen there is max 1 path."""
-        path: List[Field] = []
-        for step in range(abs(run_fields)):
-            next_fields = current_field.next_fields
-            if run_fields < 0:
-                next_fields = current_field.previous_fields
-            for next_field in next_fields:
-                if Board.is_next_field_allowed(marble_color, current_field, next_field, fields_with_marbles,
-                                               run_fields < 0):
-                    path.append(next_field)
-                    current_field = next_field
-                    # Only 1 allowed next field is assumed
+        path, blocking_indexes, blocking_masks = Board.get_path_table_entry(marble_color, current_field, run_fields)
+        if fields_with_marbles is not None and blocking_indexes and \
+                (not isinstance(fields_with_marbles, FieldsWithMarbles) or
+                 fields_with_marbles.has_marble_with_color_on(blocking_masks)):
+            # Only the start and home fields along the path can be blocked by a marble
+            for index in blocking_indexes:
+                blocking_field = path[index]
+                marble_on_field = BoardState.get_marble_for_field_opt(blocking_field, fields_with_marbles)
+                if marble_on_field is not None and marble_on_field.color_ == blocking_field.color_:
+                    path = path[:index]
                     break
         if get_shorter_path or len(path) == abs(run_fields):
-            return path
+            return list(path)
         return []
 
+    @staticmethod
+    def get_path_table_entry(marble_color, current_field, run_fields: int):
+        """Returns the path without blocking marbles, the indexes of the path fields that a marble could block and the
+        bitmasks of these fields per color of the blocking marble.
+        The entries depend on the board topology only and are computed once per color, field and step count."""
+        key = (marble_color, run_fields)
+        entry = current_field.paths.get(key)
+        if entry is None:
+            path: List[Field] = []
+            blocking_indexes = []
+            blocking_masks = {}
+            field = current_field
+            for step in range(abs(run_fields)):
+                next_fields = field.next_fields
+                if run_fields < 0:
+                    next_fields = field.previous_fields
+                for next_field in next_fields:
+                    if Board.is_next_field_allowed(marble_color, field, next_field, None, run_fields < 0):
+                        if Board.is_blocking_field(marble_color, next_field):
+                            blocking_indexes.append(len(path))
+                            blocking_masks[next_field.color_] = blocking_masks.get(next_field.color_, 0) | \
+                                next_field.mask
+                        path.append(next_field)
+                        field = next_field
+                        # Only 1 allowed next field is assumed
+                        break
+            entry = (tuple(path), tuple(blocking_indexes), tuple(blocking_masks.items()))
+            current_field.paths[key] = entry
+        return entry
+
+    @staticmethod
+    def is_blocking_field(marble_color, field) -> bool:
+        """Returns if a marble on the field blocks a marble of marble_color passing or entering it.
+        This matches the blocking check in is_next_field_allowed."""
+        if field.type_ == FieldType.START:
+            return field.color_ != marble_color  # Passing the own start field is decided by the rules
+        return field.type_ == FieldType.HOME
+
     @staticmethod
     def is_next_field_allowed(marble_color, current_field, next_field, fields_with_marbles, backwards) -> bool:
         if backwards and next_field not in current_field.previous_fields:
@@ -168,7 +218,9 @@ class Board:
             return Board.startFieldPassingForwards  # Run forwards via start?
         elif next_field.type_ == FieldType.START or next_field.type_ == FieldType.HOME:
             # Check if there is a blocking marble
-            if fields_with_marbles is not None:
+            if isinstance(fields_with_marbles, FieldsWithMarbles):
+                return not fields_with_marbles.has_marble_with_color_on(((next_field.color_, next_field.mask),))
+            elif fields_with_marbles is not None:
                 marble_on_field = BoardState.get_marble_for_field_opt(next_field, fields_with_marbles)
                 if marble_on_field is not None and marble_on_field.color_ == next_field.color_:
                     return False
@@ -184,6 +236,8 @@ class Field:
         self.color_ = color_
         self.next_fields = []
         self.previous_fields = []
+        self.mask = 1 << id_  # Bit of this field in the occupancy bitmasks
+        self.paths = {}  # Path table: (marble color, run fields) -> (path, blocking indexes, blocking masks)
 
     def __str__(self):
         return "Field[{0}], type: {1}, color: {2}.".format(self.id_, self.type_, self.color_)
@@ -201,6 +255,8 @@ class Marble:
         self.id_ = id_
         self.color_ = color_
         self.raw_id = raw_id
+        self.path_indexes = None  # Field id -> progress index of this color, set by the board
+        self.color_marble_ids = (id_,)  # Ids of the marbles with the same color, set by the board
 
     def __str__(self):
         return "Marble[{0}], color: {1}.".format(self.id_, self.color_)
@@ -209,6 +265,130 @@ class Marble:
         return self.color_[0]
 
 
+class FieldsWithMarbles(dict):
+    """Dict Field -> Marble that keeps a position index next to the dict entries.
+    The index holds the field of every marble (by marble id) and the marble on every field (by field id), so both
+    lookup directions are O(1). Besides the index, the occupied fields are kept as a bitmask per marble color
+    (bit = 1 << field id). The Zobrist key of the marble placement is updated by XOR.
+    Per marble the progress rank within its color is kept: 0 is the marble with most progress, see
+    Move.get_marble_position. All dict mutators keep the index up to date."""
+    MARBLE_SLOTS = 16
+    FIELD_SLOTS = 96
+
+    def __init__(self, fields_with_marbles=None):
+        super().__init__()
+        self.marble_fields = [None] * FieldsWithMarbles.MARBLE_SLOTS  # Marble id -> Field
+        self.field_marbles = [None] * FieldsWithMarbles.FIELD_SLOTS  # Field id -> Marble
+        self.color_masks = {}  # Color -> bitmask of fields with a marble of that color
+        self.zobrist_key = 0  # XOR of Zobrist.MARBLE_FIELD keys of all marbles
+        self.marble_progress = [-1] * FieldsWithMarbles.MARBLE_SLOTS  # Marble id -> path index of its field
+        self.marble_ranks = [0] * FieldsWithMarbles.MARBLE_SLOTS  # Marble id -> progress rank within its color
+        if fields_with_marbles:
+            for field, marble in fields_with_marbles.items():
+                self[field] = marble
+
+    def __setitem__(self, field, marble):
+        replaced_marble = self.field_marbles[field.id_]
+        if replaced_marble is not None:
+            self.color_masks[replaced_marble.color_] &= ~field.mask
+            self.zobrist_key ^= Zobrist.MARBLE_FIELD[replaced_marble.id_][field.id_]
+            if self.marble_fields[replaced_marble.id_] is field:
+                self.marble_fields[replaced_marble.id_] = None  # The replaced marble is no longer on the board
+                self._set_progress(replaced_marble, None)
+        super().__setitem__(field, marble)
+        self.field_marbles[field.id_] = marble
+        self.marble_fields[marble.id_] = field
+        self.color_masks[marble.color_] = self.color_masks.get(marble.color_, 0) | field.mask
+        self.zobrist_key ^= Zobrist.MARBLE_FIELD[marble.id_][field.id_]
+        self._set_progress(marble, field)
+
+    def __delitem__(self, field):
+        marble = self[field]
+        super().__delitem__(field)
+        self.field_marbles[field.id_] = None
+        if self.marble_fields[marble.id_] is field:
+            self.marble_fields[marble.id_] = None
+            self._set_progress(marble, None)
+        self.color_masks[marble.color_] &= ~field.mask
+        self.zobrist_key ^= Zobrist.MARBLE_FIELD[marble.id_][field.id_]
+
+    def __reduce__(self):
+        """Pickles the dict entries only, the index is rebuilt when unpickled."""
+        return FieldsWithMarbles, (dict(self),)
+
+    def update(self, fields_with_marbles=()):
+        for field, marble in dict(fields_with_marbles).items():
+            self[field] = marble
+
+    def __ior__(self, fields_with_marbles):
+        self.update(fields_with_marbles)
+        return self
+
+    def setdefault(self, field, marble=None):
+        if field not in self:
+            self[field] = marble
+        return self[field]
+
+    def pop(self, field, *default):
+        if field not in self:
+            if default:
+                return default[0]
+            raise KeyError(field)
+        marble = self[field]
+        del self[field]
+        return marble
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): dictionary is empty')
+        field = next(reversed(self))
+        return field, self.pop(field)
+
+    def clear(self):
+        super().clear()
+        self.marble_fields = [None] * FieldsWithMarbles.MARBLE_SLOTS
+        self.field_marbles = [None] * FieldsWithMarbles.FIELD_SLOTS
+        self.color_masks = {}
+        self.zobrist_key = 0
+        self.marble_progress = [-1] * FieldsWithMarbles.MARBLE_SLOTS
+        self.marble_ranks = [0] * FieldsWithMarbles.MARBLE_SLOTS
+
+    def copy(self):
+        """Shallow copy, the index lists are copied as well."""
+        new_one = FieldsWithMarbles.__new__(FieldsWithMarbles)
+        dict.update(new_one, self)
+        new_one.marble_fields = list(self.marble_fields)
+        new_one.field_marbles = list(self.field_marbles)
+        new_one.color_masks = dict(self.color_masks)
+        new_one.zobrist_key = self.zobrist_key
+        new_one.marble_progress = list(self.marble_progress)
+        new_one.marble_ranks = list(self.marble_ranks)
+        return new_one
+
+    __copy__ = copy
+
+    def _set_progress(self, marble, field):
+        """Sets the progress of the marble and updates the progress ranks of the marbles with its color."""
+        if marble.path_indexes is None:
+            return
+        progress = self.marble_progress
+        progress[marble.id_] = -1 if field is None else marble.path_indexes[field.id_]
+        for marble_id in marble.color_marble_ids:
+            marble_progress = progress[marble_id]
+            rank = 0
+            for other_marble_id in marble.color_marble_ids:
+                if progress[other_marble_id] > marble_progress:
+                    rank += 1
+            self.marble_ranks[marble_id] = rank
+
+    def has_marble_with_color_on(self, color_masks) -> bool:
+        """Returns if any of the (color, field mask) pairs has a marble of that color on one of the fields."""
+        for color, field_mask in color_masks:
+            if self.color_masks.get(color, 0) & field_mask:
+                return True
+        return False
+
+
 class BoardState:
     """Manages the positions of marbles on fields. Helper class, does not hold any state."""
     FIELDID_STATEINDEX_MAP = {5: 0, 6: 1, 7: 2, 8: 3, 9: 4, 10: 5, 11: 6, 12: 7, 13: 8, 14: 9, 15: 10, 16: 11, 17: 12,
@@ -220,6 +400,9 @@ class BoardState:
                               68: 68, 69: 69, 70: 70, 71: 71, 77: 72, 78: 73, 79: 74, 80: 75, 81: 76, 82: 77, 83: 78,
                               84: 79, 85: 80, 86: 81, 87: 82, 88: 83, 89: 84, 90: 85, 91: 86, 4: 87, 3: 88, 2: 89,
                               1: 90, 0: 91, 92: 92, 93: 93, 94: 94, 95: 95}
+    # Same mapping as array: FIELDID_STATEINDEX_ARRAY[field_id] == FIELDID_STATEINDEX_MAP[field_id]
+    FIELDID_STATEINDEX_ARRAY = np.array([state_index for _, state_index in sorted(FIELDID_STATEINDEX_MAP.items())],
+                                        dtype=np.intp)
 
     PATH_FOR_LOCATION = [[20, 21, 22, 23, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 28, 29, 30, 31,
                           32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61,
@@ -241,7 +424,7 @@ class BoardState:
     @staticmethod
     def get_initial_board_state(marbles, wait_fields) -> {}:
         """Returns the board state with all marbles on the wait fields."""
-        fields_with_marbles = dict()
+        fields_with_marbles = FieldsWithMarbles()
         copy_fields = wait_fields.copy()
         for marble in marbles:
             field = next(copy_field for copy_field in copy_fields if copy_field.color_ == marble.color_)
@@ -251,6 +434,8 @@ class BoardState:
 
     @staticmethod
     def get_field_for_marble(marble: Marble, fields_with_marbles) -> Field:
+        if isinstance(fields_with_marbles, FieldsWithMarbles):
+            return fields_with_marbles.marble_fields[marble.id_]
         for key_field, value_marble in fields_with_marbles.items():
             if value_marble == marble:
                 return key_field
@@ -261,6 +446,8 @@ class BoardState:
 
     @staticmethod
     def get_marble_for_field_opt(field: Field, fields_with_marbles):
+        if isinstance(fields_with_marbles, FieldsWithMarbles):
+            return fields_with_marbles.field_marbles[field.id_]
         if field in fields_with_marbles.keys():
             return fields_with_marbles[field]
         return None
@@ -288,16 +475,21 @@ class BoardState:
                 BoardState.put_marble_on_field(marble, wait_field, fields_with_marbles)
 
     @staticmethod
-    def get_board_state_as_matrix(fields_with_marbles, board, cur_player: Player, plays_with_color, players: [Player]):
+    def get_board_state_as_matrix(fields_with_marbles, board, cur_player: Player, plays_with_color, players: [Player],
+                                  out=None):
+        """Returns the marbles per player and all marbles (5th row) as flattened 5x96 matrix.
+        If out is given, the matrix is written into out."""
         num_players = len(players)
         num_fields = len(board.fields)
-        board_matrix = np.zeros((num_players + 1, num_fields), dtype=np.int8)  # Changed from int
-        for i in range(num_players):
-            for key_field, value_marble in fields_with_marbles.items():
-                if players[i].player_color == value_marble.color_:
-                    field_id = board.fields.index(key_field)
-                    pos = BoardState.FIELDID_STATEINDEX_MAP[field_id]
-                    board_matrix[i][pos] = 1
-                    board_matrix[4][pos] = 1  # 5th row contains all marbles
-        flat = board_matrix.flatten()
-        return flat  # board_matrix
+        if out is None:
+            out = np.zeros((num_players + 1) * num_fields, dtype=np.int8)  # Changed from int
+        else:
+            out[:] = 0
+        if fields_with_marbles:
+            color_rows = {player.player_color: i for i, player in enumerate(players)}
+            field_ids = [field.id_ for field in fields_with_marbles.keys()]
+            rows = np.array([color_rows[marble.color_] for marble in fields_with_marbles.values()], dtype=np.intp)
+            positions = BoardState.FIELDID_STATEINDEX_ARRAY[field_ids]
+            out[rows * num_fields + positions] = 1
+            out[num_players * num_fields + positions] = 1  # 5th row contains all marbles
+        return out
@@ -17,20 +17,26 @@ class Card:
 
 
 class CardState:
-    """Helps to manage the positions of all cards."""
+    """Helps to manage the positions of all cards. Next to the card lists the number of cards per card value are kept
+    as card counts: a row per player, a row for the stock and a row for the played cards."""
+    NUM_CARD_VALUES = 13
+    STOCK_ROW = -2
+    PLAYED_ROW = -1
 
     @staticmethod
-    def get_initial_card_state(cards: [Card], players):
+    def get_initial_card_state(cards: [Card], players, rng=None):
+        """Returns the stock, player and played cards. The stock is shuffled with the random generator rng, or with
+        the global random generator if rng is None."""
         stock_cards: [Card] = cards.copy()
         player_cards: {Player: [Card]} = {}
         for player in players:
             player_cards[player] = []
         played_cards: [Card] = []
-        shuffle(stock_cards)
+        CardState.shuffle(stock_cards, rng)
         return stock_cards, player_cards, played_cards
 
     @staticmethod
-    def reset(stock_cards, player_cards, played_cards):
+    def reset(stock_cards, player_cards, played_cards, rng=None):
         """Resets the stock and shuffles."""
         stock_cards.extend(played_cards)
         played_cards.clear()
@@ -38,7 +44,15 @@ class CardState:
             cards = player_cards[player]
             stock_cards.extend(cards)
             player_cards[player] = []
-        shuffle(stock_cards)
+        CardState.shuffle(stock_cards, rng)
+
+    @staticmethod
+    def shuffle(cards, rng=None):
+        """Shuffles the cards in place with the random generator rng or the global random generator."""
+        if rng is None:
+            shuffle(cards)
+        else:
+            rng.shuffle(cards)
 
     @staticmethod
     def deal_card(player, stock_cards, player_cards) -> Card:
@@ -57,18 +71,44 @@ class CardState:
             player_cards[player].clear()
 
     @staticmethod
-    def get_card_state_as_matrix(cards: [Card]):
-        """Returns the cards in a 5x13 matrix."""
-        indices = [0]*13
+    def get_card_counts(cards: [Card]) -> np.ndarray:
+        """Returns the number of cards per card value (index is card value - 1)."""
+        card_indices = np.array([card.card_value.value - 1 for card in cards], dtype=np.intp)
+        return np.bincount(card_indices, minlength=CardState.NUM_CARD_VALUES).astype(np.int8)
+
+    @staticmethod
+    def get_card_counts_of_state(stock_cards, player_cards, played_cards, players) -> np.ndarray:
+        """Returns the card counts: a row per player (in order of players), the stock row and the played row."""
+        card_counts = np.zeros((len(players) + 2, CardState.NUM_CARD_VALUES), dtype=np.int8)
+        for i, player in enumerate(players):
+            card_counts[i] = CardState.get_card_counts(player_cards[player])
+        card_counts[CardState.STOCK_ROW] = CardState.get_card_counts(stock_cards)
+        card_counts[CardState.PLAYED_ROW] = CardState.get_card_counts(played_cards)
+        return card_counts
+
+    @staticmethod
+    def move_card_counts(card_counts, from_row, to_row, cards):
+        """Moves the cards from one row of the card counts to another, for example from a hand to the played row."""
         for card in cards:
-            card_index = card.card_value.value - 1
-            indices[card_index] = indices[card_index] + 1
-        card_state = np.zeros((5, 13), dtype=np.int8)
-        for i, index in enumerate(indices):
-            if index == 1:
-                card_state[index][i] = 1
-        flat = card_state.flatten('F')
-        return flat  # card_state
+            value_index = card.card_value.value - 1
+            card_counts[from_row, value_index] -= 1
+            card_counts[to_row, value_index] += 1
+
+    @staticmethod
+    def get_card_state_as_matrix(cards: [Card], out=None):
+        """Returns the cards in a 5x13 matrix, flattened in column order. Only values with exactly one card are set.
+        If out is given, the matrix is written into out."""
+        return CardState.get_card_counts_as_matrix(CardState.get_card_counts(cards), out)
+
+    @staticmethod
+    def get_card_counts_as_matrix(counts, out=None):
+        """Returns the matrix of get_card_state_as_matrix for a row of card counts."""
+        if out is None:
+            out = np.zeros(5 * 13, dtype=np.int8)
+        else:
+            out[:] = 0
+        out[1::5] = counts == 1  # Row 1 of each column
+        return out
 
 
 class Suit(IntEnum):
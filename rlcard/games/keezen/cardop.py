@@ -1,16 +1,38 @@
 # Card operations
+from abc import ABC, abstractmethod
 from rlcard.games.keezen.board import BoardState, FieldType, Board
-from rlcard.games.keezen.move import Move, MoveType, MarbleMove
+from rlcard.games.keezen.move import Move, MoveType, CompactMove
 
 
-class CardOpStart:
-    """Card operation implementation for start move."""
+class CardOp(ABC):
+    """Base class of the card operations. Card operations generate compact moves, see CompactMove."""
 
     def __init__(self, board: Board):
         """Create card operation for board."""
         self.board = board
 
     def get_moves(self, player, plays_with_color, card, fields_with_marbles) -> [Move]:
+        """Returns the moves of the player with the card in given board position."""
+        return [CompactMove.get_move(compact_move, player, [card], self.board) for compact_move in
+                self.get_compact_moves(player, plays_with_color, card, fields_with_marbles)]
+
+    @abstractmethod
+    def get_compact_moves(self, player, plays_with_color, card, fields_with_marbles) -> []:
+        """Returns the compact moves of the player with the card in given board position."""
+
+    def get_hit_marble(self, to_field, fields_with_marbles) -> (int, int):
+        """Returns the ids of the marble that is hit on to_field and the wait field it is moved to."""
+        marble_on_field = BoardState.get_marble_for_field_opt(to_field, fields_with_marbles)
+        if marble_on_field is not None:
+            wait_field = self.board.get_empty_wait_field_with_color(marble_on_field.color_, fields_with_marbles)
+            return marble_on_field.id_, wait_field.id_
+        return CompactMove.NO_HIT, CompactMove.NO_HIT
+
+
+class CardOpStart(CardOp):
+    """Card operation implementation for start move."""
+
+    def get_compact_moves(self, player, plays_with_color, card, fields_with_marbles) -> []:
         """Evaluate if the player can move to start in given board position. """
         moves = []
         start_field = self.board.get_start_field_with_color(plays_with_color)
@@ -21,29 +43,21 @@ class CardOpStart:
             if waiting_marble is not None:
                 # There is a marble ready to set up
                 waiting_field = BoardState.get_field_for_marble(waiting_marble, fields_with_marbles)
-                marble_move = MarbleMove(waiting_marble, waiting_field, start_field, [])
-                marble_move.hit_marble_moves = self.get_hit_marble_moves(marble_move, fields_with_marbles)
-                move = Move(MoveType.START, player, [card], [marble_move])
-                moves.append(move)
+                marble_move = (waiting_marble.id_, waiting_field.id_, start_field.id_, 0) + \
+                    self.get_hit_marble(start_field, fields_with_marbles)
+                moves.append((MoveType.START, card.card_value, (marble_move,)))
         return moves
 
-    def get_hit_marble_moves(self, marble_move, fields_with_marbles) -> []:
-        marble_on_field = BoardState.get_marble_for_field_opt(marble_move.to_field, fields_with_marbles)
-        if marble_on_field is not None:
-            wait_field = self.board.get_empty_wait_field_with_color(marble_on_field.color_, fields_with_marbles)
-            return [MarbleMove(marble_on_field, marble_move.to_field, wait_field, [])]
-        return []
-
 
-class CardOpRun:
+class CardOpRun(CardOp):
     """Card operation implementation for run move."""
 
     def __init__(self, board, run_fields):
         """Create card operation with board and run fields."""
-        self.board = board
+        super().__init__(board)
         self.run_fields = run_fields
 
-    def get_moves(self, player, plays_with_color, card, fields_with_marbles) -> [Move]:
+    def get_compact_moves(self, player, plays_with_color, card, fields_with_marbles) -> []:
         """Evaluate if the player can run with marbles in given board position. """
         moves = []
         for marble in self.board.get_marbles_with_color(plays_with_color):
@@ -51,28 +65,16 @@ class CardOpRun:
             path = self.board.get_path_for_marble(marble, self.run_fields, fields_with_marbles)
             if path:
                 from_field = BoardState.get_field_for_marble(marble, fields_with_marbles)
-                marble_move = MarbleMove(marble, from_field, path[-1], path)
-                marble_move.hit_marble_moves = self.get_hit_marble_moves(marble_move, fields_with_marbles)
-                move = Move(MoveType.RUN, player, [card], [marble_move])
-                moves.append(move)
+                marble_move = (marble.id_, from_field.id_, path[-1].id_, self.run_fields) + \
+                    self.get_hit_marble(path[-1], fields_with_marbles)
+                moves.append((MoveType.RUN, card.card_value, (marble_move,)))
         return moves
 
-    def get_hit_marble_moves(self, marble_move, fields_with_marbles) -> []:
-        marble_on_field = BoardState.get_marble_for_field_opt(marble_move.to_field, fields_with_marbles)
-        if marble_on_field is not None:
-            wait_field = self.board.get_empty_wait_field_with_color(marble_on_field.color_, fields_with_marbles)
-            return [MarbleMove(marble_on_field, marble_move.to_field, wait_field, [])]
-        return []
-
 
-class CardOpSwitchOneOwnMarble:
+class CardOpSwitchOneOwnMarble(CardOp):
     """Card operation implementation for switch move."""
 
-    def __init__(self, board):
-        """Create card operation with board."""
-        self.board = board
-
-    def get_moves(self, player, plays_with_color, card, fields_with_marbles) -> [Move]:
+    def get_compact_moves(self, player, plays_with_color, card, fields_with_marbles) -> []:
         """Evaluate if the player can switch with marbles in given board position. """
         moves = []
         plays_with_marbles = self.board.get_marbles_with_color(plays_with_color)
@@ -82,10 +84,11 @@ class CardOpSwitchOneOwnMarble:
                 for marble2 in [marble for marble in self.board.marbles if marble not in plays_with_marbles]:
                     marble2_field = BoardState.get_field_for_marble(marble2, fields_with_marbles)
                     if self.is_marble_switchable(marble2, marble2_field, plays_with_color):
-                        marble_move1 = MarbleMove(marble1, marble1_field, marble2_field, [])
-                        marble_move2 = MarbleMove(marble2, marble2_field, marble1_field, [])
-                        marble_moves = [marble_move1, marble_move2]
-                        moves.append(Move(MoveType.SWITCH, player, [card], marble_moves))
+                        marble_move1 = (marble1.id_, marble1_field.id_, marble2_field.id_, 0,
+                                        CompactMove.NO_HIT, CompactMove.NO_HIT)
+                        marble_move2 = (marble2.id_, marble2_field.id_, marble1_field.id_, 0,
+                                        CompactMove.NO_HIT, CompactMove.NO_HIT)
+                        moves.append((MoveType.SWITCH, card.card_value, (marble_move1, marble_move2)))
         return moves
 
     @staticmethod
@@ -98,15 +101,15 @@ class CardOpSwitchOneOwnMarble:
         return True
 
 
-class CardOpSplitTwoMarbles:
+class CardOpSplitTwoMarbles(CardOp):
     """Card operation implementation for split over two marbles move."""
 
     def __init__(self, board: Board):
         """Create card operation with board and run fields."""
-        self.board = board
+        super().__init__(board)
         self.run_fields = 7
 
-    def get_moves(self, player, plays_with_color, card, fields_with_marbles) -> [Move]:
+    def get_compact_moves(self, player, plays_with_color, card, fields_with_marbles) -> []:
         """Evaluate if the player can move 7 steps with one or two marbles in given board position. """
         moves = []
         marbles_with_color = self.board.get_marbles_with_color(plays_with_color)
@@ -114,10 +117,9 @@ class CardOpSplitTwoMarbles:
             path = self.board.get_path_for_marble(marble, 7, fields_with_marbles)  # Check path length 7
             if path:
                 from_field = BoardState.get_field_for_marble(marble, fields_with_marbles)
-                marble_move = MarbleMove(marble, from_field, path[-1], path)
-                marble_move.hit_marble_moves = self._get_hit_marble_moves(marble_move, fields_with_marbles)
-                move = Move(MoveType.SPLIT, player, [card], [marble_move])
-                moves.append(move)
+                marble_move = (marble.id_, from_field.id_, path[-1].id_, 7) + \
+                    self.get_hit_marble(path[-1], fields_with_marbles)
+                moves.append((MoveType.SPLIT, card.card_value, (marble_move,)))
             # Check combinations with other own marbles
             for length in range(4, 7):  # 6, 5, and 4, check other marbles: 1, 2 and 3.
                 path = self.board.get_path_for_marble(marble, length, fields_with_marbles, True)
@@ -133,14 +135,11 @@ class CardOpSplitTwoMarbles:
                                     if other_marble != marble and other_marble != marble_on_field]:
                         path2 = self.board.get_path_for_marble(marble2, 7 - length, c_state)
                         if path2:
-                            mm1 = MarbleMove(marble, BoardState.get_field_for_marble(marble, fields_with_marbles),
-                                             path[-1], path)
-                            mm1.hit_marble_moves = self._get_hit_marble_moves(mm1, fields_with_marbles)
-                            mm2 = MarbleMove(marble2, BoardState.get_field_for_marble(marble2, fields_with_marbles),
-                                             path2[-1], path2)
-                            mm2.hit_marble_moves = self._get_hit_marble_moves(mm2, c_state)
-                            move = Move(MoveType.SPLIT, player, [card], [mm1, mm2])
-                            moves.append(move)
+                            mm1 = (marble.id_, BoardState.get_field_for_marble(marble, fields_with_marbles).id_,
+                                   path[-1].id_, length) + self.get_hit_marble(path[-1], fields_with_marbles)
+                            mm2 = (marble2.id_, BoardState.get_field_for_marble(marble2, fields_with_marbles).id_,
+                                   path2[-1].id_, 7 - length) + self.get_hit_marble(path2[-1], c_state)
+                            moves.append((MoveType.SPLIT, card.card_value, (mm1, mm2)))
                 else:  # Shorter path: check if a own marble is blocking the path
                     b_marble = self._is_blocked_by_own_marble(marble, path, fields_with_marbles)
                     if b_marble is not None:
@@ -155,12 +154,11 @@ class CardOpSplitTwoMarbles:
                                                                 marble_on_field.color_, c_state), c_state)
                             path2 = self.board.get_path_for_marble(marble, length, c_state)
                             if path2:
-                                mm1 = MarbleMove(b_marble, BoardState.get_field_for_marble(b_marble, fields_with_marbles), path[-1], path)
-                                mm1.hit_marble_moves = self._get_hit_marble_moves(mm1, fields_with_marbles)
-                                mm2 = MarbleMove(marble, BoardState.get_field_for_marble(marble, fields_with_marbles), path2[-1], path2)
-                                mm2.hit_marble_moves = self._get_hit_marble_moves(mm2, c_state)
-                                move = Move(MoveType.SPLIT, player, [card], [mm1, mm2])
-                                moves.append(move)
+                                mm1 = (b_marble.id_, BoardState.get_field_for_marble(b_marble, fields_with_marbles).id_,
+                                       path[-1].id_, 7 - length) + self.get_hit_marble(path[-1], fields_with_marbles)
+                                mm2 = (marble.id_, BoardState.get_field_for_marble(marble, fields_with_marbles).id_,
+                                       path2[-1].id_, length) + self.get_hit_marble(path2[-1], c_state)
+                                moves.append((MoveType.SPLIT, card.card_value, (mm1, mm2)))
         if not moves:
             # Check if player will finish his last marble to continue with teammate marbles
             if player.player_color == plays_with_color:
@@ -179,22 +177,16 @@ class CardOpSplitTwoMarbles:
                             for tm_marble in tm_marbles:
                                 path2 = self.board.get_path_for_marble(tm_marble, 7 - len(f_path), fields_with_marbles)
                                 if path2:
-                                    mm1 = MarbleMove(f_marble, BoardState.get_field_for_marble(f_marble, fields_with_marbles),
-                                                     f_path[-1], f_path)
-                                    mm2 = MarbleMove(tm_marble, BoardState.get_field_for_marble(tm_marble, fields_with_marbles),
-                                                     path2[-1], path2)
-                                    mm2.hit_marble_moves = self._get_hit_marble_moves(mm2, fields_with_marbles)
-                                    move = Move(MoveType.SPLIT, player, [card], [mm1, mm2])
-                                    moves.append(move)
+                                    mm1 = (f_marble.id_,
+                                           BoardState.get_field_for_marble(f_marble, fields_with_marbles).id_,
+                                           f_path[-1].id_, len(f_path), CompactMove.NO_HIT, CompactMove.NO_HIT)
+                                    mm2 = (tm_marble.id_,
+                                           BoardState.get_field_for_marble(tm_marble, fields_with_marbles).id_,
+                                           path2[-1].id_, 7 - len(f_path)) + \
+                                        self.get_hit_marble(path2[-1], fields_with_marbles)
+                                    moves.append((MoveType.SPLIT, card.card_value, (mm1, mm2)))
         return moves
 
-    def _get_hit_marble_moves(self, marble_move, fields_with_marbles) -> []:
-        marble_on_field = BoardState.get_marble_for_field_opt(marble_move.to_field, fields_with_marbles)
-        if marble_on_field is not None:
-            wait_field = self.board.get_empty_wait_field_with_color(marble_on_field.color_, fields_with_marbles)
-            return [MarbleMove(marble_on_field, marble_move.to_field, wait_field, [])]
-        return []
-
     def _is_blocked_by_own_marble(self, marble, path, fields_with_marbles):
         """Returns a marble if it blocks the path of another marble."""
         last_field = BoardState.get_field_for_marble(marble, fields_with_marbles)
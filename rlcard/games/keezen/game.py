@@ -1,9 +1,14 @@
+from collections.abc import Sequence
 from copy import copy
 
+import numpy as np
+
 from rlcard.games.keezen.card import CardState, Suit
 from rlcard.games.keezen.board import BoardState
-from rlcard.games.keezen.move import Move, MoveType
+from rlcard.games.keezen.move import Move, MoveType, CompactMove
+from rlcard.games.keezen.observation import ObservationEncoder
 from rlcard.games.keezen.player import Player
+from rlcard.games.keezen.zobrist import Zobrist
 
 from colorama import Fore, Style
 
@@ -22,15 +27,28 @@ class Game:
         self.board = board
         self.cards = self.rules.initialize_cards()
         self.card_ops = self.rules.initialize_card_ops(self.cards, board)
-        self.game_history = []
-        self.legal_moves = {}  # Maps action_index -> move
+        self.undo_log = []  # UndoRecord per move, see apply and undo
+        self.legal_moves = {}  # Maps action_index -> compact move, filled by KeezenGameAdapter
+        self.action_codec = ActionCodec(GameActions.ALL_ACTIONS_SIMPLE if rules.game_type == "KeezSimple"
+                                        else GameActions.ALL_ACTIONS_271)
+        self.rng = None  # Random generator for shuffling the cards, None uses the global random generator
+
+    def seed(self, base_seed, game_index=0):
+        """Gives the game its own random generator, derived from the base seed and game index."""
+        self.rng = Game.create_rng(base_seed, game_index)
+
+    @staticmethod
+    def create_rng(base_seed, game_index=0):
+        """Returns a numpy random generator for the (base seed, game index) pair. The streams of different game
+        indexes are independent, so parallel games are reproducible regardless of the order they are run in."""
+        return np.random.default_rng(np.random.SeedSequence([base_seed, game_index]))
 
     def init_game(self):
         """Initializes the game. All marbles at wait fields, cards in stock."""
-        self.game_history = []
+        self.undo_log = []
         round_number = 0
         move_number = 0
-        stock_cards, player_cards, played_cards = CardState.get_initial_card_state(self.cards, self.players)
+        stock_cards, player_cards, played_cards = CardState.get_initial_card_state(self.cards, self.players, self.rng)
         fields_with_marbles = BoardState.get_initial_board_state(self.board.marbles, self.board.waitFields)
         players_play_with_color = {}
         for player in self.players:
@@ -40,8 +58,11 @@ class Game:
         self._deal_cards(deal_player, stock_cards, player_cards, round_number)
         game_state = GameState(fields_with_marbles, stock_cards, player_cards, played_cards,
                                players_play_with_color, deal_player, move_player, round_number, move_number)
-        if self.allow_step_back:
-            self.game_history.append(game_state)
+        game_state.card_counts = CardState.get_card_counts_of_state(stock_cards, player_cards, played_cards,
+                                                                    self.players)
+        game_state.observation = ObservationEncoder(self.players, len(self.board.fields))
+        game_state.observation.reset(game_state, self.players)
+        game_state.zobrist_key = Zobrist.get_cards_and_turn_key(game_state, self.players)
         return game_state, self.players.index(move_player)
 
     def render(self, game_state):
@@ -118,52 +139,107 @@ class Game:
 
     def get_allowed_moves(self, game_state) -> [Move]:
         """Returns the allowed moves. Might generate a DEAL event as well."""
+        return self.get_moves_from_compact(self.get_allowed_compact_moves(game_state), game_state)
+
+    def get_allowed_compact_moves(self, game_state) -> []:
+        """Returns the allowed moves in compact encoding, see CompactMove. Might generate a DEAL event as well."""
         allowed_moves = []
         player_cards = game_state.player_cards[game_state.move_player]
         filtered_cards = {}
         for card in player_cards:
             if card.card_value not in filtered_cards.values():
                 filtered_cards[card] = card.card_value
+        plays_with_color = game_state.players_play_with_color[game_state.move_player]
         for card in filtered_cards.keys():
-            moves_for_card = []
-            card_ops = self.card_ops[card]
-            for card_op in card_ops:
-                moves = card_op.get_moves(game_state.move_player,
-                                          game_state.players_play_with_color[game_state.move_player], card,
-                                          game_state.fields_with_marbles)
-                moves_for_card.extend(moves)
-            allowed_moves.extend(moves_for_card)
+            for card_op in self.card_ops[card]:
+                allowed_moves.extend(card_op.get_compact_moves(game_state.move_player, plays_with_color, card,
+                                                               game_state.fields_with_marbles))
         if not allowed_moves:
             if player_cards:
-                cards_move = Move(MoveType.THROW_CARDS, game_state.move_player, player_cards, [])
-                allowed_moves.append(cards_move)
+                allowed_moves.append(CompactMove.THROW_CARDS)
             elif Game._is_round_over(game_state):
                 done, rewards = self.is_over(game_state)
                 if not done:
-                    allowed_moves.append(Move(MoveType.DEAL, game_state.deal_player, [], []))
+                    allowed_moves.append(CompactMove.DEAL)
         return allowed_moves
 
+    def get_moves_from_compact(self, compact_moves, game_state) -> [Move]:
+        """Builds the moves for compact moves of the move player (or deal player) in the game state."""
+        return list(AllowedMoves(self.board, compact_moves, game_state))
+
     def step(self, move, game_state) -> ():
+        """Does the move and returns a copy of the changed game state, the rewards and if the game is done.
+        If step back is allowed, the changes are recorded in the undo log, see step_back."""
+        rewards, done = self._do_move(move, game_state, UndoRecord(game_state) if self.allow_step_back else None)
+        copy_game_state = copy(game_state)
+        if self.allow_step_back:
+            copy_game_state.last_move = move
+        return copy_game_state, rewards, done
+
+    def apply(self, move, game_state) -> ():
+        """Does the move in place and records the changes in the undo log. Returns the rewards and if the game is
+        done. The move is reverted with undo."""
+        return self._do_move(move, game_state, UndoRecord(game_state))
+
+    def undo(self):
+        """Reverts the last recorded move and returns the game state it was done on, or None if there is no move."""
+        if not self.undo_log:
+            return None
+        undo_record = self.undo_log.pop()
+        undo_record.revert(self)
+        return undo_record.game_state
+
+    def _do_move(self, move, game_state, undo_record) -> ():
+        """Changes the game state in place with the move. The changes are recorded in the undo record if given."""
+        game_state.compact_moves = game_state.legal_actions = None  # Clear the legal moves memo
         if move:
             if move.move_type == MoveType.DEAL:
                 if not Game._is_round_over(game_state):
                     raise ValueError("Cannot deal when round is not finished.")
+                if undo_record is not None:
+                    undo_record.record_components(('stock_cards', 'player_cards', 'played_cards', 'card_counts',
+                                                   'observation'))
                 game_state.round_number += 1
-                if not game_state.stock_cards:
-                    CardState.reset(game_state.stock_cards, game_state.player_cards, game_state.played_cards)
+                stock_cards = game_state.get_mutable('stock_cards')
+                player_cards = game_state.get_mutable('player_cards')
+                if not stock_cards:
+                    CardState.reset(stock_cards, player_cards, game_state.get_mutable('played_cards'), self.rng)
                     game_state.deal_player = game_state.deal_player.get_next_player(self.players)
                 elif self.rules.rotate_dealer_each_round:
                     game_state.deal_player = game_state.deal_player.get_next_player(self.players)
-                self._deal_cards(game_state.deal_player, game_state.stock_cards, game_state.player_cards,
-                                 game_state.round_number)
+                self._deal_cards(game_state.deal_player, stock_cards, player_cards, game_state.round_number)
+                game_state.card_counts = CardState.get_card_counts_of_state(stock_cards, player_cards,
+                                                                            game_state.played_cards, self.players)
+                if game_state.observation is not None:
+                    game_state.get_mutable('observation').reset_cards(game_state, self.players)
             else:
-                CardState.play_cards(move.player, move.cards, game_state.player_cards, game_state.played_cards)
-                for marble_move in move.marble_moves:
-                    _ = BoardState.put_marble_on_field(marble_move.marble, marble_move.to_field,
-                                                       game_state.fields_with_marbles)
-                    for hit_marble_move in marble_move.hit_marble_moves:
-                        _ = BoardState.put_marble_on_field(hit_marble_move.marble, hit_marble_move.to_field,
-                                                           game_state.fields_with_marbles)
+                player_index = self.players.index(move.player)
+                if undo_record is not None:
+                    undo_record.record_cards(move.player, move.cards)
+                card_counts = game_state.get_mutable('card_counts')
+                game_state.zobrist_key ^= Zobrist.get_play_cards_key(Zobrist.HAND[player_index], move.cards,
+                                                                     card_counts[player_index],
+                                                                     card_counts[CardState.PLAYED_ROW])
+                CardState.move_card_counts(card_counts, player_index, CardState.PLAYED_ROW, move.cards)
+                observation = game_state.get_mutable('observation')
+                if observation is not None:
+                    observation.play_cards(player_index, move.cards)
+                CardState.play_cards(move.player, move.cards, game_state.get_mutable('player_cards'),
+                                     game_state.get_mutable('played_cards'))
+                if move.marble_moves:
+                    fields_with_marbles = game_state.get_mutable('fields_with_marbles')
+                    for marble_move in move.marble_moves:
+                        if undo_record is not None:
+                            undo_record.marble_fields.append((marble_move.marble, marble_move.from_field))
+                        _ = BoardState.put_marble_on_field(marble_move.marble, marble_move.to_field,
+                                                           fields_with_marbles)
+                        for hit_marble_move in marble_move.hit_marble_moves:
+                            if undo_record is not None:  # The hit marble was on the field the marble moved to
+                                undo_record.marble_fields.append((hit_marble_move.marble, marble_move.to_field))
+                            _ = BoardState.put_marble_on_field(hit_marble_move.marble, hit_marble_move.to_field,
+                                                               fields_with_marbles)
+                    if observation is not None:
+                        observation.move_marbles(move, fields_with_marbles)
                 if self.rules.switch_color and self.board.is_color_finished(game_state.move_player.player_color,
                                                                             game_state.fields_with_marbles, self.rules):
                     team_mate_color = game_state.move_player.get_team_mate().player_color
@@ -172,7 +248,14 @@ class Game:
                                                              self.rules)) and \
                             game_state.move_player.player_color == game_state.move_player_plays_with_color():
                         # Switch color
-                        game_state.players_play_with_color[game_state.move_player] = team_mate_color
+                        if undo_record is not None:
+                            undo_record.previous_color = game_state.move_player_plays_with_color()
+                        move_player_index = self.players.index(game_state.move_player)
+                        game_state.zobrist_key ^= \
+                            Zobrist.PLAYS_WITH_COLOR[move_player_index][move_player_index] ^ \
+                            Zobrist.PLAYS_WITH_COLOR[move_player_index][
+                                self.players.index(game_state.move_player.get_team_mate())]
+                        game_state.get_mutable('players_play_with_color')[game_state.move_player] = team_mate_color
                 game_state.move_number += 1
         done, end_rewards = self.is_over(game_state)
 
@@ -182,14 +265,16 @@ class Game:
         else:
             if move and move.move_type == MoveType.DEAL:
                 game_state.move_player = game_state.deal_player.get_next_player(self.players)
+                # Dealing changes all hands, recompute the cards and turn part of the key
+                game_state.zobrist_key = Zobrist.get_cards_and_turn_key(game_state, self.players)
             else:
+                game_state.zobrist_key ^= Zobrist.MOVE_PLAYER[self.players.index(game_state.move_player)]
                 game_state.move_player = game_state.move_player.get_next_player(self.players)
-
-        copy_game_state = copy(game_state)
-        if self.allow_step_back:
-            copy_game_state.last_move = move
-            self.game_history.append(copy_game_state)
-        return copy_game_state, rewards, done
+                game_state.zobrist_key ^= Zobrist.MOVE_PLAYER[self.players.index(game_state.move_player)]
+        if undo_record is not None:
+            undo_record.move = move
+            self.undo_log.append(undo_record)
+        return rewards, done
 
     @staticmethod
     def _is_round_over(game_state) -> bool:
@@ -232,11 +317,8 @@ class Game:
         return False, None
 
     def step_back(self):
-        """Returns and removes the last game_state from game history."""
-        if self.game_history:
-            prev_game_state = self.game_history.pop()
-            return prev_game_state
-        return None
+        """Reverts the last move with the undo log and returns the game state before the move."""
+        return self.undo()
 
     def _deal_cards(self, deal_player, stock_cards, player_cards, round_number):
         """Deals the cards for a new round."""
@@ -248,13 +330,103 @@ class Game:
                 player = player.get_next_player(self.players)
 
 
+class AllowedMoves(Sequence):
+    """The moves for compact moves of the move player (or deal player) in a game state, a read-only list of Move
+    objects that are built on first access. It keeps the players and cards it needs, so it stays valid when the game
+    state changes."""
+
+    def __init__(self, board, compact_moves, game_state):
+        self.board = board
+        self.compact_moves = compact_moves
+        self.move_player = game_state.move_player
+        self.deal_player = game_state.deal_player
+        self.player_cards = list(game_state.player_cards[game_state.move_player])
+        self._moves = None
+
+    def _get_moves(self) -> [Move]:
+        if self._moves is None:
+            self._moves = [CompactMove.get_move(compact_move, self.deal_player if compact_move[0] == MoveType.DEAL
+                                                else self.move_player, self.player_cards, self.board)
+                           for compact_move in self.compact_moves]
+        return self._moves
+
+    def __getitem__(self, index):
+        return self._get_moves()[index]
+
+    def __len__(self):
+        return len(self.compact_moves)
+
+
+class UndoRecord:
+    """The changes of one move to a game state: the fields the moved and hit marbles came from, the hand before the
+    cards were played, the color switch, the turn and counters. A deal changes all cards, the card components before
+    the deal are kept instead."""
+
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.move = None
+        self.deal_player = game_state.deal_player
+        self.move_player = game_state.move_player
+        self.round_number = game_state.round_number
+        self.move_number = game_state.move_number
+        self.zobrist_key = game_state.zobrist_key
+        self.marble_fields = []  # (marble, field before the move) in order of the move
+        self.player = None
+        self.cards = None
+        self.hand = None
+        self.played_count = 0
+        self.previous_color = None
+        self.components = {}  # Name -> component before a deal
+
+    def record_components(self, names):
+        for name in names:
+            self.components[name] = self.game_state.share_component(name)
+
+    def record_cards(self, player, cards):
+        self.player = player
+        self.cards = list(cards)
+        self.hand = list(self.game_state.player_cards[player])
+        self.played_count = len(self.game_state.played_cards)
+
+    def revert(self, game):
+        """Reverts the changes of the move in the game state."""
+        game_state = self.game_state
+        game_state.compact_moves = game_state.legal_actions = None
+        for name, component in self.components.items():
+            game_state.set_shared_component(name, component)
+        if self.marble_fields:
+            fields_with_marbles = game_state.get_mutable('fields_with_marbles')
+            for marble, field in reversed(self.marble_fields):
+                _ = BoardState.put_marble_on_field(marble, field, fields_with_marbles)
+            if game_state.observation is not None:
+                game_state.get_mutable('observation').move_marbles(self.move, fields_with_marbles)
+        if self.player is not None:
+            game_state.get_mutable('player_cards')[self.player] = self.hand
+            del game_state.get_mutable('played_cards')[self.played_count:]
+            CardState.move_card_counts(game_state.get_mutable('card_counts'), CardState.PLAYED_ROW,
+                                       game.players.index(self.player), self.cards)
+            if game_state.observation is not None:
+                game_state.get_mutable('observation').unplay_cards(game.players.index(self.player), self.cards)
+        if self.previous_color is not None:
+            game_state.get_mutable('players_play_with_color')[self.move_player] = self.previous_color
+        game_state.deal_player = self.deal_player
+        game_state.move_player = self.move_player
+        game_state.round_number = self.round_number
+        game_state.move_number = self.move_number
+        game_state.zobrist_key = self.zobrist_key
+
+
 class GameState:
     """A GameState holds the state of a game. This means the marble positions, player cards, move player, the colors
-        players play with, deal player, round and move numbers."""
+        players play with, deal player, round and move numbers.
+        Copies are copy-on-write: a copy shares the components (see COMPONENTS) with the original. Code that changes a
+        component in place gets it with get_mutable, which clones a shared component first."""
+    COMPONENTS = ('fields_with_marbles', 'stock_cards', 'played_cards', 'player_cards', 'card_counts',
+                  'players_play_with_color', 'observation')
 
     def __init__(self, fields_with_marbles, stock_cards, player_cards, played_cards, players_play_with_color,
                  deal_player, move_player, round_number, move_number):
-        self.fields_with_marbles = dict(fields_with_marbles)
+        self.fields_with_marbles = fields_with_marbles.copy()
         self.stock_cards = list(stock_cards)
         self.played_cards = list(played_cards)
         self.player_cards = dict(player_cards)
@@ -264,28 +436,68 @@ class GameState:
         self.round_number = round_number
         self.move_number = move_number
         self.last_move = None
+        self.card_counts = None  # Cards per card value of players, stock and played cards, see CardState
+        self.observation = None  # ObservationEncoder, patched by Game.step
+        self.zobrist_key = 0  # Zobrist key of cards and turn, updated by Game.step
+        self.compact_moves = None  # Memo of the allowed compact moves, cleared by Game.step
+        self.legal_actions = None  # Memo of the legal actions of KeezenGameAdapter, cleared by Game.step
+        self._owned = set(GameState.COMPONENTS)  # Components that are not shared and can be changed in place
 
     def __copy__(self):
-        new_one = type(self)(self.fields_with_marbles, self.stock_cards, self.player_cards, self.played_cards,
-                             self.players_play_with_color, self.deal_player, self.move_player, self.round_number,
-                             self.move_number)
+        new_one = type(self).__new__(type(self))
+        new_one.__dict__.update(self.__dict__)
+        new_one.last_move = None
+        new_one.compact_moves = None
+        new_one.legal_actions = None
+        # All components are shared now, the first change clones them
+        self._owned = set()
+        new_one._owned = set()
         return new_one
 
+    def get_mutable(self, name):
+        """Returns the component with the name for changing it in place. A shared component is cloned first."""
+        if name not in self._owned:
+            component = getattr(self, name)
+            if name == 'player_cards':
+                component = {player: list(cards) for player, cards in component.items()}
+            elif component is not None:
+                component = component.copy()
+            setattr(self, name, component)
+            self._owned.add(name)
+        return getattr(self, name)
+
+    def share_component(self, name):
+        """Returns the component with the name and marks it shared, so a change clones it."""
+        self._owned.discard(name)
+        return getattr(self, name)
+
+    def set_shared_component(self, name, component):
+        """Sets a component that might be shared with other game states."""
+        setattr(self, name, component)
+        self._owned.discard(name)
+
+    def get_zobrist_key(self) -> int:
+        """Returns the 64-bit Zobrist key of the state: marble placement, hands, played cards, move player and the
+        colors players play with."""
+        return self.fields_with_marbles.zobrist_key ^ self.zobrist_key
+
     def move_player_plays_with_color(self):
         return self.players_play_with_color[self.move_player]
 
     def get_state_for_player(self, player: Player):
         state = dict()
         state['state_for_player'] = player
-        state['fields_with_marbles'] = dict(self.fields_with_marbles)
+        # The components are shared with the state, they are cloned when the game state changes them
+        self._owned.difference_update(('fields_with_marbles', 'played_cards', 'players_play_with_color'))
+        state['fields_with_marbles'] = self.fields_with_marbles
         state['stock_count'] = len(self.stock_cards)
-        state['played_cards'] = list(self.played_cards)
+        state['played_cards'] = self.played_cards
         state['player_cards'] = list(self.player_cards[player])
         player_card_count = {}
         for player in self.player_cards.keys():
             player_card_count[player] = len(self.player_cards[player])
         state['player_card_count'] = player_card_count
-        state['players_play_with_color'] = dict(self.players_play_with_color)
+        state['players_play_with_color'] = self.players_play_with_color
         state['deal_player'] = self.deal_player
         state['move_player'] = self.move_player
         state['round_number'] = self.round_number
@@ -361,3 +573,94 @@ class GameActions:
                           'SW11P2T0', 'SW11P2T1', 'SW11P2T2', 'SW11P2T3', 'SW11P3O0', 'SW11P3O1', 'SW11P3O2',
                           'SW11P3O3',
                           'SW11P3T0', 'SW11P3T1', 'SW11P3T2', 'SW11P3T3', 'TC']
+
+
+class ActionCodec:
+    """Computes the action index of a compact move without building the raw action string, see
+    CompactMove.get_raw_action. A raw action like "SP07P13T2" consists of the parts: move type, card value, position
+    of the first marble, split length, kind (P, T, A, B or O) and position of the second marble. The parts are combined
+    to an int key, the action index is looked up in a list that is filled from the raw actions of the action space.
+    Switches with an opponent marble are kind A (next player) or B, or O if the action space has no A and B kinds,
+    like GameActions.ALL_ACTIONS_SIMPLE."""
+    MOVE_TYPE_CODES = {"NO": 0, "DL": 1, "TC": 2, "ST": 3, "RU": 4, "SP": 5, "SW": 6}
+    COMPACT_MOVE_TYPE_CODES = {MoveType.DEAL: 1, MoveType.THROW_CARDS: 2, MoveType.START: 3, MoveType.RUN: 4,
+                               MoveType.SPLIT: 5, MoveType.SWITCH: 6}
+    KIND_CODES = {"P": 1, "T": 2, "A": 3, "B": 4, "O": 5}
+    NO_INDEX = -1
+
+    def __init__(self, actions):
+        """Create codec for the action space, for example GameActions.ALL_ACTIONS_271."""
+        self.actions = actions
+        self.indexes = [ActionCodec.NO_INDEX] * ActionCodec.get_key(len(ActionCodec.MOVE_TYPE_CODES), 0, 0, 0, 0, 0)
+        kind_codes = set()
+        for index, raw_action in enumerate(actions):
+            key = ActionCodec.get_raw_action_key(raw_action)
+            kind_codes.add(key // 4 % 6)  # Kind code part of the key, see get_key
+            if self.indexes[key] == ActionCodec.NO_INDEX:
+                self.indexes[key] = index
+        self.opponent_kinds = ActionCodec.KIND_CODES["A"] in kind_codes  # Else opponent switches are kind O
+
+    @staticmethod
+    def get_key(move_type_code, card_value, position, split_length, kind_code, position2) -> int:
+        return ((((move_type_code * 14 + card_value) * 4 + position) * 8 + split_length) * 6 + kind_code) * 4 \
+            + position2
+
+    @staticmethod
+    def get_raw_action_key(raw_action) -> int:
+        """Returns the key of a raw action, for example "SP07P13T2"."""
+        move_type_code = ActionCodec.MOVE_TYPE_CODES[raw_action[:2]]
+        if len(raw_action) == 2:
+            return ActionCodec.get_key(move_type_code, 0, 0, 0, 0, 0)
+        rest = raw_action[6:]
+        split_length = 0
+        if raw_action[:2] == "SP" and rest:
+            split_length = int(rest[0])
+            rest = rest[1:]
+        kind_code = position2 = 0
+        if rest:
+            kind_code = ActionCodec.KIND_CODES[rest[0]]
+            position2 = int(rest[1])
+        return ActionCodec.get_key(move_type_code, int(raw_action[2:4]), int(raw_action[5]), split_length, kind_code,
+                                   position2)
+
+    def get_action_index(self, compact_move, player, game, game_state) -> int:
+        """Returns the action index of the compact move of the player."""
+        move_type, card_value, compact_marble_moves = compact_move
+        move_type_code = ActionCodec.COMPACT_MOVE_TYPE_CODES[move_type]
+        if not compact_marble_moves:
+            key = ActionCodec.get_key(move_type_code, 0, 0, 0, 0, 0)
+        else:
+            marbles = game.board.marbles
+            marble1 = marbles[compact_marble_moves[0][0]]
+            split_length = kind_code = position2 = 0
+            if len(compact_marble_moves) == 2:
+                marble2 = marbles[compact_marble_moves[1][0]]
+                team_mate_color = player.get_team_mate().player_color
+                if move_type == MoveType.SPLIT:
+                    split_length = abs(compact_marble_moves[0][3])
+                    if marble1.color_ == marble2.color_:
+                        kind_code = ActionCodec.KIND_CODES["P"]
+                    elif marble2.color_ == team_mate_color:
+                        kind_code = ActionCodec.KIND_CODES["T"]
+                elif move_type == MoveType.SWITCH:
+                    if marble2.color_ == team_mate_color:
+                        kind_code = ActionCodec.KIND_CODES["T"]
+                    elif not self.opponent_kinds:
+                        kind_code = ActionCodec.KIND_CODES["O"]
+                    elif marble2.color_ == player.get_next_player(game.players).player_color:
+                        kind_code = ActionCodec.KIND_CODES["A"]
+                    else:
+                        kind_code = ActionCodec.KIND_CODES["B"]
+                if kind_code:
+                    position2 = Move.get_marble_position(game, game_state, marble2)
+            key = ActionCodec.get_key(move_type_code, int(card_value), Move.get_marble_position(game, game_state,
+                                                                                                 marble1),
+                                      split_length, kind_code, position2)
+        action_index = self.indexes[key]
+        if action_index == ActionCodec.NO_INDEX:
+            raise KeyError(CompactMove.get_raw_action(compact_move, player, game, game_state))
+        return action_index
+
+    def get_raw_action(self, action_index) -> str:
+        """Returns the raw action of an action index, for logging and rendering."""
+        return self.actions[action_index]
@@ -1,6 +1,7 @@
 import numpy as np
 from rlcard.games.keezen.board import FieldColor, Board
-from rlcard.games.keezen.game import Game, GameActions
+from rlcard.games.keezen.game import AllowedMoves, Game, GameActions
+from rlcard.games.keezen.move import CompactMove, MoveType
 from rlcard.games.keezen.player import Player, PlayerLocation, Team
 from rlcard.games.keezen.rules import Rules
 
@@ -22,6 +23,7 @@ class KeezenGameAdapter:
 
         self.game = Game(Rules(KeezenGameAdapter.game_type), self.players, Board(self.players))
         self.game_state = None
+        self._legal_moves_game_state = None  # The game state for which Game.legal_moves is filled
 
         self._ACTION_SPACE = {}  # [action_id: action_index] for example: ("RU01P0": 2)
         idx = 0
@@ -40,6 +42,7 @@ class KeezenGameAdapter:
 
     def init_game(self):
         self.game_state = None
+        self.game.allow_step_back = self.allow_step_back
         self.game_state, player_idx = self.game.init_game()
         self.state = self.get_state(player_idx)
         return self.state, player_idx
@@ -48,9 +51,10 @@ class KeezenGameAdapter:
         """Do a move. Action is the raw id of a move."""
         move = None
         if action != 'NO':
-            moves = [move for move in self.game.get_allowed_moves(self.game_state) if
-                     move.get_raw_action(self.game, self.game_state) == action]
-            move = moves[0]
+            if self._legal_moves_game_state is not self.game_state:
+                self._get_legal_actions(self.game.get_allowed_compact_moves(self.game_state))
+            compact_move = self.game.legal_moves[self._ACTION_SPACE[action]]
+            move = self.game.get_moves_from_compact([compact_move], self.game_state)[0]
         self.game_state, rewards, done = self.game.step(move, self.game_state)
         player_idx = self.game.players.index(self.game_state.move_player)
 
@@ -67,18 +71,32 @@ class KeezenGameAdapter:
             return player_state, player_idx
 
     def get_state(self, player_id):
-        allowed_moves = self.game.get_allowed_moves(self.game_state)
-        if self.is_over():
-            actions = []
-        else:
-            actions = dict(self._get_legal_actions(allowed_moves))
+        actions = self.get_legal_actions()
+        compact_moves = list(self.game_state.compact_moves)
         player_state = self.game_state.get_state_for_player(self.game.players[player_id])
-        state = {'legal_actions': actions, 'allowed_moves': allowed_moves, 'game_state': self.game_state,
+        state = {'legal_actions': actions, 'compact_moves': compact_moves,
+                 'allowed_moves': AllowedMoves(self.game.board, compact_moves, self.game_state),
+                 'game_state': self.game_state,
                  'state_for_player': player_state['state_for_player'],
                  'fields_with_marbles': player_state['fields_with_marbles'],
                  'players_play_with_color': player_state['players_play_with_color']}
         return state
 
+    def get_legal_actions(self):
+        """Returns the legal actions (action index: action matrix) of the current game state. The legal moves of a
+        game state are generated once and kept in the game state until Game.step changes it."""
+        game_state = self.game_state
+        if game_state.legal_actions is None:
+            if self.is_over():
+                game_state.compact_moves = []
+                game_state.legal_actions = []
+            else:
+                game_state.compact_moves = self.game.get_allowed_compact_moves(game_state)
+                game_state.legal_actions = self._get_legal_actions(game_state.compact_moves)
+        if isinstance(game_state.legal_actions, dict):
+            return dict(game_state.legal_actions)
+        return []
+
     def get_state_for_current_player(self):
         player_idx = self.game.players.index(self.game_state.move_player)
         return self.get_state(player_idx)
@@ -102,17 +120,30 @@ class KeezenGameAdapter:
     def render(self):
         self.game.render(self.game_state)
 
-    def _get_legal_actions(self, allowed_moves) -> [int]:
+    def _get_legal_actions(self, compact_moves) -> [int]:
+        """Returns the action matrix per legal action index. Fills Game.legal_moves with the compact move per legal
+        action index, so step can look up the move of an action."""
         action_space = self._ACTION_SPACE
         legal_moves = {}  # [action_index: action_matrix]
-        for move in allowed_moves:
-            raw_action = move.get_raw_action(self.game, self.game_state)
-            action_idx = action_space[raw_action]
-            action_matrix = move.get_action_matrix(self.game, self.game_state)
+        compact_moves_by_index = {}  # [action_index: compact_move]
+        move_player = self.game_state.move_player
+        # A DEAL move has no cards and marble moves, so its action matrix does not depend on the player
+        action_matrices = CompactMove.get_action_matrices(compact_moves, move_player,
+                                                          self.game_state.player_cards[move_player], self.game,
+                                                          self.game_state)
+        for compact_move, action_matrix in zip(compact_moves, action_matrices):
+            player = move_player
+            if compact_move[0] == MoveType.DEAL:
+                player = self.game_state.deal_player
+            action_idx = self.game.action_codec.get_action_index(compact_move, player, self.game, self.game_state)
+            if action_idx not in compact_moves_by_index:
+                compact_moves_by_index[action_idx] = compact_move
             legal_moves[action_idx] = action_matrix
         if not legal_moves:
             no_idx = action_space['NO']
             legal_moves[no_idx] = np.zeros(68, dtype=np.int8)  # pass
+        self.game.legal_moves = compact_moves_by_index
+        self._legal_moves_game_state = self.game_state
         return legal_moves
 
     def get_num_players(self) -> int:
@@ -1,6 +1,6 @@
 import numpy as np
 
-from rlcard.games.keezen.board import Field, Marble, BoardState
+from rlcard.games.keezen.board import Field, Marble, BoardState, FieldsWithMarbles
 from rlcard.games.keezen.player import Player
 
 
@@ -68,73 +68,17 @@ class Move:
 
     # Get al actions based on marble positions: P0, P1, P2 and P3 in stead of marble id
     def get_raw_action(self, game, game_state):
-        if self.move_type == MoveType.THROW_CARDS:
-            return "TC"
-        elif self.move_type == MoveType.DEAL:
-            return "DL"
-        else:
-            if self.move_type == MoveType.START:
-                return "ST" + str(self.cards[0].card_value.value).zfill(2) + "P" \
-                       + str(Move.get_marble_position(game, game_state, self.marble_moves[0].marble))
-            elif self.move_type == MoveType.RUN:
-                return "RU" + str(self.cards[0].card_value.value).zfill(2) + "P" \
-                       + str(Move.get_marble_position(game, game_state, self.marble_moves[0].marble))
-            elif self.move_type == MoveType.SPLIT:
-                result = "SP" + str(self.cards[0].card_value.value).zfill(2) + "P" \
-                         + str(Move.get_marble_position(game, game_state, self.marble_moves[0].marble))
-                if len(self.marble_moves) == 2:
-                    result += str(len(self.marble_moves[0].steps))
-                    if self.marble_moves[0].marble.color_ == self.marble_moves[1].marble.color_:
-                        result += "P" + str(Move.get_marble_position(game, game_state, self.marble_moves[1].marble))
-                    elif self.marble_moves[1].marble.color_ == self.player.get_team_mate().player_color:
-                        result += "T" + str(Move.get_marble_position(game, game_state, self.marble_moves[1].marble))
-                return result
-            elif self.move_type == MoveType.SWITCH:
-                result = "SW" + str(self.cards[0].card_value.value).zfill(2) + "P" \
-                         + str(Move.get_marble_position(game, game_state, self.marble_moves[0].marble))
-                if len(self.marble_moves) == 2:
-                    if self.marble_moves[1].marble.color_ == self.player.get_team_mate().player_color:
-                        result += "T" + str(Move.get_marble_position(game, game_state, self.marble_moves[1].marble))
-                    else:
-                        next_player_color = self.player.get_next_player(game.players).player_color
-                        oppo_char = "B"
-                        if next_player_color == self.marble_moves[1].marble.color_:
-                            oppo_char = "A"
-                        result += oppo_char + str(
-                            Move.get_marble_position(game, game_state, self.marble_moves[1].marble))
-                return result
+        return CompactMove.get_raw_action(CompactMove.from_move(self), self.player, game, game_state)
 
     def get_action_matrix(self, game, game_state):
         """Returns a matrix representation of this move."""
-        # First [13x4]/[52] are the cards, [16] are the affected marbles: 0-3 own (0 is most progress),
-        player_color_position = {}
-        index_of_player = game.players.index(self.player)
-        player_color_position[self.player.player_color] = 0
-        for index in range(1, 4):
-            index_of_next_player = (index_of_player + index) % len(game.players)
-            player_color_position[game.players[index_of_next_player].player_color] = index_of_next_player
-
-        result = np.zeros(68, dtype=np.int8)
-        for card in self.cards:
-            suit = card.suit
-            value = card.card_value
-            index = suit*13 + value - 1
-            result[index] = 1
-        affected_marbles = []
-        for marble_move in self.marble_moves:
-            affected_marbles.append(marble_move.marble)
-            for hit_marble_move in marble_move.hit_marble_moves:
-                affected_marbles.append(hit_marble_move.marble)
-        for marble in affected_marbles:
-            marble_pos = Move.get_marble_position(game, game_state, marble)
-            # player pos = 0: own, 1: next player, 2: teammate, 3: other player
-            player_pos = player_color_position[marble.color_]
-            result[player_pos*4 + marble_pos] = 1
-        return result
+        return CompactMove.get_action_matrix(CompactMove.from_move(self), self.player, self.cards, game, game_state)
 
     @staticmethod
     def get_marble_position(game, game_state, a_marble):
         """Gives the position index of a marble. Most progress == 0, less progress: 1, 2 and last: 3"""
+        if a_marble.path_indexes is not None and isinstance(game_state.fields_with_marbles, FieldsWithMarbles):
+            return game_state.fields_with_marbles.marble_ranks[a_marble.id_]
         result = 0
         color_index = 0
         for i in range(len(game.players)):
@@ -170,3 +114,152 @@ class MarbleMove:
                                                                                       self.from_field.id_,
                                                                                       self.to_field.id_,
                                                                                       len(self.hit_marble_moves))
+
+
+class CompactMove:
+    """Compact encoding of a move, used by the card operations and the move generation. Move objects are only built
+    from it when a caller needs one. The encoding is a tuple (move type, card value, marble moves), with per marble
+    move a tuple of ints: (marble id, from field id, to field id, run fields, hit marble id, hit marble to field id).
+    The run fields are negative when running backwards. Without a hit marble the hit ids are NO_HIT.
+    The card of a move is the first card in the hand of the player with the card value."""
+    NO_HIT = -1
+    THROW_CARDS = (MoveType.THROW_CARDS, 0, ())
+    DEAL = (MoveType.DEAL, 0, ())
+    RAW_ACTION_PREFIX = {MoveType.START: "ST", MoveType.RUN: "RU", MoveType.SPLIT: "SP", MoveType.SWITCH: "SW"}
+
+    @staticmethod
+    def get_move(compact_move, player, player_cards, board) -> Move:
+        """Builds the Move for the compact move. The cards are the cards in the hand of the player."""
+        move_type, card_value, compact_marble_moves = compact_move
+        if move_type == MoveType.THROW_CARDS:
+            return Move(move_type, player, player_cards, [])
+        elif move_type == MoveType.DEAL:
+            return Move(move_type, player, [], [])
+        marble_moves = []
+        for marble_id, from_field_id, to_field_id, run_fields, hit_marble_id, hit_to_field_id in compact_marble_moves:
+            marble = board.marbles[marble_id]
+            from_field = board.fields[from_field_id]
+            steps, _, _ = board.get_path_table_entry(marble.color_, from_field, run_fields)
+            marble_move = MarbleMove(marble, from_field, board.fields[to_field_id], list(steps))
+            marble_move.hit_marble_moves = []
+            if hit_marble_id != CompactMove.NO_HIT:
+                marble_move.hit_marble_moves.append(MarbleMove(board.marbles[hit_marble_id], marble_move.to_field,
+                                                               board.fields[hit_to_field_id], []))
+            marble_moves.append(marble_move)
+        return Move(move_type, player, CompactMove.get_cards(compact_move, player_cards), marble_moves)
+
+    @staticmethod
+    def from_move(move):
+        """Returns the compact encoding of a Move."""
+        if move.move_type == MoveType.THROW_CARDS:
+            return CompactMove.THROW_CARDS
+        elif move.move_type == MoveType.DEAL:
+            return CompactMove.DEAL
+        compact_marble_moves = []
+        for marble_move in move.marble_moves:
+            run_fields = len(marble_move.steps)
+            if marble_move.steps and marble_move.steps[0] in marble_move.from_field.previous_fields:
+                run_fields = -run_fields
+            hit_marble_id = hit_to_field_id = CompactMove.NO_HIT
+            for hit_marble_move in marble_move.hit_marble_moves:
+                hit_marble_id = hit_marble_move.marble.id_
+                hit_to_field_id = hit_marble_move.to_field.id_
+            compact_marble_moves.append((marble_move.marble.id_, marble_move.from_field.id_, marble_move.to_field.id_,
+                                         run_fields, hit_marble_id, hit_to_field_id))
+        return move.move_type, move.cards[0].card_value, tuple(compact_marble_moves)
+
+    @staticmethod
+    def get_cards(compact_move, player_cards):
+        """Returns the cards that are played with the compact move."""
+        move_type, card_value, _ = compact_move
+        if move_type == MoveType.THROW_CARDS:
+            return player_cards
+        elif move_type == MoveType.DEAL:
+            return []
+        return [next(card for card in player_cards if card.card_value == card_value)]
+
+    @staticmethod
+    def get_raw_action(compact_move, player, game, game_state):
+        """Returns the raw action, for example "SP07P13T2". Based on marble positions: P0, P1, P2 and P3 in stead of
+        marble id."""
+        move_type, card_value, compact_marble_moves = compact_move
+        if move_type == MoveType.THROW_CARDS:
+            return "TC"
+        elif move_type == MoveType.DEAL:
+            return "DL"
+        marbles = game.board.marbles
+        marble1 = marbles[compact_marble_moves[0][0]]
+        result = CompactMove.RAW_ACTION_PREFIX[move_type] + str(int(card_value)).zfill(2) + "P" \
+            + str(Move.get_marble_position(game, game_state, marble1))
+        if len(compact_marble_moves) == 2:
+            marble2 = marbles[compact_marble_moves[1][0]]
+            if move_type == MoveType.SPLIT:
+                result += str(abs(compact_marble_moves[0][3]))
+                if marble1.color_ == marble2.color_:
+                    result += "P" + str(Move.get_marble_position(game, game_state, marble2))
+                elif marble2.color_ == player.get_team_mate().player_color:
+                    result += "T" + str(Move.get_marble_position(game, game_state, marble2))
+            elif move_type == MoveType.SWITCH:
+                if marble2.color_ == player.get_team_mate().player_color:
+                    result += "T" + str(Move.get_marble_position(game, game_state, marble2))
+                else:
+                    next_player_color = player.get_next_player(game.players).player_color
+                    oppo_char = "B"
+                    if next_player_color == marble2.color_:
+                        oppo_char = "A"
+                    result += oppo_char + str(Move.get_marble_position(game, game_state, marble2))
+        return result
+
+    @staticmethod
+    def get_action_matrix(compact_move, player, cards, game, game_state):
+        """Returns a matrix representation of the move. The cards are the cards played with the move."""
+        # First [13x4]/[52] are the cards, [16] are the affected marbles: 0-3 own (0 is most progress),
+        player_color_position = {}
+        index_of_player = game.players.index(player)
+        player_color_position[player.player_color] = 0
+        for index in range(1, 4):
+            index_of_next_player = (index_of_player + index) % len(game.players)
+            player_color_position[game.players[index_of_next_player].player_color] = index_of_next_player
+
+        result = np.zeros(68, dtype=np.int8)
+        for card in cards:
+            suit = card.suit
+            value = card.card_value
+            index = suit*13 + value - 1
+            result[index] = 1
+        marbles = game.board.marbles
+        affected_marbles = []
+        for marble_id, _, _, _, hit_marble_id, _ in compact_move[2]:
+            affected_marbles.append(marbles[marble_id])
+            if hit_marble_id != CompactMove.NO_HIT:
+                affected_marbles.append(marbles[hit_marble_id])
+        for marble in affected_marbles:
+            marble_pos = Move.get_marble_position(game, game_state, marble)
+            # player pos = 0: own, 1: next player, 2: teammate, 3: other player
+            player_pos = player_color_position[marble.color_]
+            result[player_pos*4 + marble_pos] = 1
+        return result
+
+    @staticmethod
+    def get_action_matrices(compact_moves, player, player_cards, game, game_state):
+        """Returns the action matrices of the compact moves of the player as one (number of moves, 68) array, see
+        get_action_matrix. The cards are the cards in the hand of the player."""
+        result = np.zeros((len(compact_moves), 68), dtype=np.int8)
+        player_color_position = {a_player.player_color: index for index, a_player in enumerate(game.players)}
+        player_color_position[player.player_color] = 0
+        marble_columns = [player_color_position[marble.color_]*4 + Move.get_marble_position(game, game_state, marble)
+                          for marble in game.board.marbles]  # Marble id -> column
+        rows = []
+        columns = []
+        for row, compact_move in enumerate(compact_moves):
+            for card in CompactMove.get_cards(compact_move, player_cards):
+                rows.append(row)
+                columns.append(card.suit*13 + card.card_value - 1)
+            for marble_id, _, _, _, hit_marble_id, _ in compact_move[2]:
+                rows.append(row)
+                columns.append(marble_columns[marble_id])
+                if hit_marble_id != CompactMove.NO_HIT:
+                    rows.append(row)
+                    columns.append(marble_columns[hit_marble_id])
+        result[rows, columns] = 1
+        return result
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class NumpyDMCAgent:
+    """Agent that plays with the value network of a trained DMCAgent, evaluated with numpy instead of torch. The
+    network is an MLP with ReLU activations of the state features (615) followed by the action features (68), with
+    a value per row, see DMCNet. The layers are loaded from an .npz file of export_dmc_agent."""
+
+    def __init__(self, weights, biases, action_size=68, exp_epsilon=0.0):
+        """The weights [inputs, outputs] and biases [outputs] per layer, the last layer has one output."""
+        self.use_raw = False
+        self.weights = [np.asarray(weight, dtype=np.float32) for weight in weights]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+        self.action_size = action_size
+        self.exp_epsilon = exp_epsilon
+
+    @staticmethod
+    def load(path, exp_epsilon=0.0):
+        """Loads the agent from an .npz file of save or export_dmc_agent."""
+        with np.load(path) as data:
+            num_layers = len([key for key in data.files if key.startswith('weight_')])
+            return NumpyDMCAgent([data['weight_' + str(i)] for i in range(num_layers)],
+                                 [data['bias_' + str(i)] for i in range(num_layers)], int(data['action_size']),
+                                 exp_epsilon)
+
+    def save(self, path):
+        """Saves the layers to an .npz file."""
+        arrays = {'action_size': np.array(self.action_size)}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays['weight_' + str(i)] = weight
+            arrays['bias_' + str(i)] = bias
+        np.savez(path, **arrays)
+
+    def forward(self, obs, actions):
+        """Returns the values of the rows of state features [rows, 615] and action features [rows, 68]."""
+        return self._forward_hidden(np.concatenate((obs, actions), axis=1) @ self.weights[0] + self.biases[0])
+
+    def _forward_hidden(self, x):
+        for weight, bias in zip(self.weights[1:], self.biases[1:]):
+            x = np.maximum(x, 0) @ weight + bias
+        return x.ravel()
+
+    def predict(self, state):
+        """Returns the legal action indexes and their values. The state part of the first layer is computed once."""
+        action_keys = np.array(list(state['legal_actions'].keys()))
+        actions = np.array(list(state['legal_actions'].values()), dtype=np.float32)
+        state_size = len(self.weights[0]) - self.action_size
+        obs = state['obs'].astype(np.float32).ravel()
+        x = obs @ self.weights[0][:state_size] + actions @ self.weights[0][state_size:] + self.biases[0]
+        return action_keys, self._forward_hidden(x)
+
+    def step(self, state):
+        action_keys, values = self.predict(state)
+        if self.exp_epsilon > 0 and np.random.rand() < self.exp_epsilon:
+            return np.random.choice(action_keys)
+        return action_keys[np.argmax(values)]
+
+    def eval_step(self, state):
+        action_keys, values = self.predict(state)
+        info = {'values': {state['raw_legal_actions'][i]: float(values[i]) for i in range(len(action_keys))}}
+        return action_keys[np.argmax(values)], info
+
+
+def export_dmc_agent(agent, path):
+    """Writes the value network of a DMCAgent (see rlcard.agents.dmc_agent) to an .npz file for NumpyDMCAgent."""
+    state_dict = agent.net.state_dict()
+    weights = [tensor.detach().cpu().numpy().T for key, tensor in state_dict.items() if key.endswith('.weight')]
+    biases = [tensor.detach().cpu().numpy() for key, tensor in state_dict.items() if key.endswith('.bias')]
+    NumpyDMCAgent(weights, biases, int(np.prod(agent.action_shape))).save(path)
+
+
+def quantize_dmc_agent(agent):
+    """Returns a copy of a DMCAgent that evaluates on the cpu with int8 weights: the linear layers of the value network
+    are replaced by dynamically quantized ones (torch.ao.quantization.quantize_dynamic), that quantize the
+    activations per forward and use the int8 matmul kernels of torch."""
+    import copy
+    import torch
+    net = copy.deepcopy(agent.net).cpu().eval()
+    quantized_agent = copy.copy(agent)
+    quantized_agent.net = torch.ao.quantization.quantize_dynamic(net, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized_agent.set_device('cpu')
+    return quantized_agent
+
+
+def get_reference_states(env, num_states, rng=None):
+    """Returns num_states states of the env from games with random legal actions, a reference state set for
+    get_action_agreement."""
+    rng = rng if rng is not None else np.random.default_rng()
+    states = []
+    state, _ = env.reset()
+    while len(states) < num_states:
+        states.append(state)
+        action_keys = list(state['legal_actions'].keys())
+        state, _ = env.step(action_keys[rng.integers(len(action_keys))])
+        if env.is_over():
+            state, _ = env.reset()
+    return states
+
+
+def get_action_agreement(agent, reference_agent, states):
+    """Returns the fraction of the states in which the agent picks the same action as the reference agent, for
+    example a quantized agent and its full precision original."""
+    return float(np.mean([agent.eval_step(state)[0] == reference_agent.eval_step(state)[0] for state in states]))
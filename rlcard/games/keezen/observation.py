@@ -0,0 +1,129 @@
+import numpy as np
+
+from rlcard.games.keezen.board import BoardState
+from rlcard.games.keezen.card import CardState
+
+
+class ObservationEncoder:
+    """Keeps the observation of a game state up to date. The observation (615 values) consists of:
+    [5] active player, [65] own cards, [65] played cards and [5x96] marbles per player and all marbles.
+    The played cards and board planes are patched with the deltas of each move instead of being rebuilt."""
+    NUM_CARD_VALUES = 13
+    CARD_PLANE_SIZE = 65
+    OWN_CARDS_OFFSET = 5
+    PLAYED_CARDS_OFFSET = 70
+    BOARD_OFFSET = 135
+    OBSERVATION_SIZE = 615
+
+    def __init__(self, players, num_fields=96):
+        self.num_players = len(players)
+        self.num_fields = num_fields
+        self.color_rows = {player.player_color: i for i, player in enumerate(players)}
+        self.field_positions = [BoardState.FIELDID_STATEINDEX_MAP[field_id] for field_id in range(num_fields)]
+        self.buffer = np.zeros(ObservationEncoder.OBSERVATION_SIZE, dtype=np.int8)
+        self.hand_planes = np.zeros((self.num_players, ObservationEncoder.CARD_PLANE_SIZE), dtype=np.int8)
+        self.hand_counts = [[0] * ObservationEncoder.NUM_CARD_VALUES for _ in range(self.num_players)]
+        self.played_counts = [0] * ObservationEncoder.NUM_CARD_VALUES
+
+    def copy(self):
+        new_one = ObservationEncoder.__new__(ObservationEncoder)
+        new_one.num_players = self.num_players
+        new_one.num_fields = self.num_fields
+        new_one.color_rows = self.color_rows
+        new_one.field_positions = self.field_positions
+        new_one.buffer = self.buffer.copy()
+        new_one.hand_planes = self.hand_planes.copy()
+        new_one.hand_counts = [list(counts) for counts in self.hand_counts]
+        new_one.played_counts = list(self.played_counts)
+        return new_one
+
+    def reset(self, game_state, players):
+        """Rebuilds the complete observation from the game state."""
+        self.buffer[:] = 0
+        for field in game_state.fields_with_marbles.keys():
+            self._set_field(field, game_state.fields_with_marbles)
+        self.reset_cards(game_state, players)
+
+    def reset_cards(self, game_state, players):
+        """Rebuilds the card planes from the game state, for example after dealing."""
+        for i in range(len(players)):
+            self.hand_counts[i] = game_state.card_counts[i].tolist()
+            for value_index in range(ObservationEncoder.NUM_CARD_VALUES):
+                self._set_hand_slot(i, value_index)
+        self.played_counts = game_state.card_counts[CardState.PLAYED_ROW].tolist()
+        for value_index in range(ObservationEncoder.NUM_CARD_VALUES):
+            self._set_played_slot(value_index)
+
+    def play_cards(self, player_index, cards):
+        """Moves the cards from the hand of the player to the played cards."""
+        hand_counts = self.hand_counts[player_index]
+        for card in cards:
+            value_index = card.card_value.value - 1
+            hand_counts[value_index] -= 1
+            self.played_counts[value_index] += 1
+            self._set_hand_slot(player_index, value_index)
+            self._set_played_slot(value_index)
+
+    def unplay_cards(self, player_index, cards):
+        """Moves the cards from the played cards back to the hand of the player, reverts play_cards."""
+        hand_counts = self.hand_counts[player_index]
+        for card in cards:
+            value_index = card.card_value.value - 1
+            hand_counts[value_index] += 1
+            self.played_counts[value_index] -= 1
+            self._set_hand_slot(player_index, value_index)
+            self._set_played_slot(value_index)
+
+    def move_marbles(self, move, fields_with_marbles):
+        """Updates the board planes for the fields touched by the move. Call after the marbles are moved."""
+        for marble_move in move.marble_moves:
+            self._set_field(marble_move.from_field, fields_with_marbles)
+            self._set_field(marble_move.to_field, fields_with_marbles)
+            for hit_marble_move in marble_move.hit_marble_moves:
+                self._set_field(hit_marble_move.to_field, fields_with_marbles)
+
+    def get_observation(self, player_index):
+        """Returns a copy of the observation for the player."""
+        observation = self.buffer.copy()
+        observation[player_index] = 1
+        observation[ObservationEncoder.OWN_CARDS_OFFSET:ObservationEncoder.PLAYED_CARDS_OFFSET] = \
+            self.hand_planes[player_index]
+        return observation
+
+    def _set_field(self, field, fields_with_marbles):
+        """Sets the board planes for one field from the marble that is on it."""
+        position = ObservationEncoder.BOARD_OFFSET + self.field_positions[field.id_]
+        for row in range(self.num_players + 1):
+            self.buffer[position + row * self.num_fields] = 0
+        marble = BoardState.get_marble_for_field_opt(field, fields_with_marbles)
+        if marble is not None:
+            self.buffer[position + self.color_rows[marble.color_] * self.num_fields] = 1
+            self.buffer[position + self.num_players * self.num_fields] = 1  # Last row contains all marbles
+
+    # The card planes are a 5x13 matrix flattened in column order. As in CardState.get_card_state_as_matrix a card
+    # value is only encoded (row 1) when there is exactly one card of that value.
+    def _set_hand_slot(self, player_index, value_index):
+        self.hand_planes[player_index][value_index * 5 + 1] = 1 if self.hand_counts[player_index][value_index] == 1 \
+            else 0
+
+    def _set_played_slot(self, value_index):
+        self.buffer[ObservationEncoder.PLAYED_CARDS_OFFSET + value_index * 5 + 1] = \
+            1 if self.played_counts[value_index] == 1 else 0
+
+
+def encode_observation(game_state, player_index, players, board, out=None):
+    """Builds the observation for the player from scratch, without the incremental ObservationEncoder.
+    If out is given, the observation is written into out (int8 array of 615 values), so the caller can reuse it."""
+    if out is None:
+        out = np.empty(ObservationEncoder.OBSERVATION_SIZE, dtype=np.int8)
+    player = players[player_index]
+    out[:ObservationEncoder.OWN_CARDS_OFFSET] = 0
+    out[player_index] = 1
+    CardState.get_card_counts_as_matrix(game_state.card_counts[player_index],
+                                        out[ObservationEncoder.OWN_CARDS_OFFSET:ObservationEncoder.PLAYED_CARDS_OFFSET])
+    CardState.get_card_counts_as_matrix(game_state.card_counts[CardState.PLAYED_ROW],
+                                        out[ObservationEncoder.PLAYED_CARDS_OFFSET:ObservationEncoder.BOARD_OFFSET])
+    BoardState.get_board_state_as_matrix(game_state.fields_with_marbles, board, player,
+                                         game_state.players_play_with_color[player], players,
+                                         out[ObservationEncoder.BOARD_OFFSET:])
+    return out
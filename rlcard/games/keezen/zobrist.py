@@ -0,0 +1,53 @@
+import random
+
+_KEY_RNG = random.Random(0x4B45455A)  # Own generator: fixed keys that do not touch the global random state
+_MAX_CARDS_PER_VALUE = 4
+
+
+class Zobrist:
+    """Random 64-bit keys for Zobrist hashing of a game state. The key of a state is the XOR of the keys of its parts,
+    so a move updates the key by XOR-ing out the old parts and XOR-ing in the new parts.
+    The marble part of the key is kept by FieldsWithMarbles, the other parts by Game.step."""
+    MARBLE_FIELD = [[_KEY_RNG.getrandbits(64) for _ in range(96)] for _ in range(16)]  # [marble id][field id]
+    HAND = [[[_KEY_RNG.getrandbits(64) for _ in range(_MAX_CARDS_PER_VALUE + 1)] for _ in range(13)]
+            for _ in range(4)]  # [player index][card value - 1][count]
+    PLAYED = [[_KEY_RNG.getrandbits(64) for _ in range(_MAX_CARDS_PER_VALUE + 1)]
+              for _ in range(13)]  # [card value - 1][count]
+    MOVE_PLAYER = [_KEY_RNG.getrandbits(64) for _ in range(4)]  # [player index]
+    PLAYS_WITH_COLOR = [[_KEY_RNG.getrandbits(64) for _ in range(4)] for _ in range(4)]  # [player index][color index]
+
+    @staticmethod
+    def get_cards_and_turn_key(game_state, players) -> int:
+        """Computes the key of the hands, played cards, move player and the colors players play with."""
+        key = Zobrist.MOVE_PLAYER[players.index(game_state.move_player)]
+        color_indexes = {player.player_color: i for i, player in enumerate(players)}
+        for i, player in enumerate(players):
+            key ^= Zobrist.PLAYS_WITH_COLOR[i][color_indexes[game_state.players_play_with_color[player]]]
+            key ^= Zobrist.get_cards_key(Zobrist.HAND[i], game_state.player_cards[player])
+        key ^= Zobrist.get_cards_key(Zobrist.PLAYED, game_state.played_cards)
+        return key
+
+    @staticmethod
+    def get_cards_key(keys, cards) -> int:
+        """Computes the key of a collection of cards: per card value the key of its count."""
+        counts = [0] * 13
+        for card in cards:
+            counts[card.card_value.value - 1] += 1
+        key = 0
+        for value_index, count in enumerate(counts):
+            key ^= keys[value_index][count]
+        return key
+
+    @staticmethod
+    def get_play_cards_key(hand_keys, cards, hand_counts, played_counts) -> int:
+        """Computes the key change of moving the cards from the hand to the played cards. Call before the cards are
+        moved, only the counts of the played card values are changed. The counts are rows of the card counts."""
+        key = 0
+        for value in {card.card_value for card in cards}:
+            played = sum(1 for card in cards if card.card_value == value)
+            value_index = value.value - 1
+            in_hand = int(hand_counts[value_index])
+            on_pile = int(played_counts[value_index])
+            key ^= hand_keys[value_index][in_hand] ^ hand_keys[value_index][in_hand - played]
+            key ^= Zobrist.PLAYED[value_index][on_pile] ^ Zobrist.PLAYED[value_index][on_pile + played]
+        return key
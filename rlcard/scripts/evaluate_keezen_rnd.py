@@ -2,48 +2,81 @@
 This script picks the newest not already processed model from the experiment id path.
 Already processed models and the results are in the file processed.csv.
 Typically, this script is run from a cron job.
+With --port the games are played by workers on other machines, started with --worker host:port. The workers need
+the experiment folder at the same relative path. A job of --games_per_job games that takes longer than --job_timeout
+seconds is handed out again, lower them for slow workers.
+With --quantize the torch models are evaluated on the cpu with int8 weights and matmuls, see quantize_dmc_agent. The
+script reports per model how often the quantized model picks the same action as the torch model on a reference set
+of states from random games.
 The script create_graph_rnd.py renders a graph from the file processed.csv.
 Set the path of the experiment.
 """
 import csv
 import fnmatch
 import os
+import sys
 import argparse
+from functools import partial
+import numpy as np
 import rlcard
-from rlcard.utils import get_device, set_seed, tournament
+from rlcard.envs.keezen import tournament
+from rlcard.games.keezen.numpyagent import NumpyDMCAgent, get_action_agreement, get_reference_states, \
+    quantize_dmc_agent
+from rlcard.envs.keezen_remote import TournamentCoordinator, run_tournament_worker
+from rlcard.utils import get_device, set_seed
 from collections import OrderedDict
 
 
-def load_model(model_path, env=None, position=None, device=None):
-    if os.path.isfile(model_path):  # Torch model
+def load_model(model_path, env=None, position=None, device=None, quantize=False):
+    if model_path.endswith('.npz'):  # Numpy model, see export_dmc_keezen.py
+        agent = NumpyDMCAgent.load(model_path)
+    elif os.path.isfile(model_path):  # Torch model
         import torch
         agent = torch.load(model_path, map_location=device)
         agent.set_device(device)
+        if quantize:
+            agent = quantize_dmc_agent(agent)
     elif model_path == 'random':  # Random model
         from rlcard.agents import RandomAgent
         agent = RandomAgent(num_actions=env.num_actions)
     return agent
 
 
+def load_agents(env, models, device, quantize=False):
+    return [load_model(model_path, env, position, device, quantize) for position, model_path in enumerate(models)]
+
+
+def report_agreement(models, num_reference_states):
+    """Prints per torch model how often its quantized model picks the same action on the reference states."""
+    reference_states = get_reference_states(rlcard.make('keezen', config={'seed': 0}), num_reference_states,
+                                            np.random.default_rng(0))
+    for model_path in dict.fromkeys(model_path for model_path in models if model_path.endswith('.pth')):
+        agent = load_model(model_path, device='cpu')
+        agreement = get_action_agreement(quantize_dmc_agent(agent), agent, reference_states)
+        print("Agreement int8: " + model_path + " " + str(agreement))
+
+
 def evaluate(args):
 
     # To use the cpu, if a training is claiming the GPU: device = torch.device("cpu")
-    device = get_device()
-        
+    device = get_device() if any(model_path.endswith('.pth') for model_path in args.models) else None
+    if args.quantize:  # Quantized models run on the cpu
+        device = 'cpu'
+        report_agreement(args.models, args.reference_states)
+
     # Seed numpy, torch, random
     set_seed(args.seed)
 
-    # Make the environment with seed
-    env = rlcard.make(args.env, config={'seed': args.seed})
-
-    # Load models
-    agents = []
-    for position, model_path in enumerate(args.models):
-        agents.append(load_model(model_path, env, position, device))
-    env.set_agents(agents)
-
-    # Evaluate
-    rewards = tournament(env, args.num_games)
+    # Evaluate: each worker makes the environment with seed and loads the models
+    if args.port is not None:
+        coordinator = TournamentCoordinator('', args.port, args.job_timeout)
+        coordinator.add_tournament(args.models, args.num_games, {'seed': args.seed}, args.games_per_job)
+        [(rewards, _, _)] = coordinator.wait()
+        coordinator.close()
+    else:
+        rewards, _, _ = tournament({'seed': args.seed}, partial(load_agents, models=args.models, device=device,
+                                                                quantize=args.quantize),
+                                   args.num_games, args.num_workers, args.num_concurrent)
     for position, reward in enumerate(rewards):
         print(position, args.models[position], reward)
     return rewards
@@ -56,6 +89,21 @@ if __name__ == '__main__':
     parser.add_argument('--cuda', type=str, default='0')
     parser.add_argument('--seed', type=int, default=None)
     parser.add_argument('--num_games', type=int, default=1000)
+    parser.add_argument('--num_workers', type=int, default=None)  # Default the number of cpus
+    parser.add_argument('--num_concurrent', type=int, default=None)  # Games per worker with batched forwards
+    parser.add_argument('--port', type=int, default=None)  # Hand out the games to remote workers on this port
+    parser.add_argument('--worker', type=str, default=None)  # Play the games of the coordinator at host:port
+    parser.add_argument('--games_per_job', type=int, default=100)  # Games per job of a remote worker
+    parser.add_argument('--job_timeout', type=float, default=TournamentCoordinator.JOB_TIMEOUT)  # Seconds per job
+    parser.add_argument('--quantize', action='store_true')  # Evaluate the torch models with int8 weights
+    parser.add_argument('--reference_states', type=int, default=1000)  # States of the agreement check of --quantize
+
+    known_args, _ = parser.parse_known_args()
+    if known_args.worker:
+        host, port = known_args.worker.rsplit(':', 1)
+        device = 'cpu' if known_args.quantize else get_device()
+        run_tournament_worker(host, int(port), partial(load_agents, device=device, quantize=known_args.quantize))
+        sys.exit()
 
     # Get all model file names, get the number of frames and order descending
     path = './experiments/dmc_keezen_result/keezenexpid8/'
@@ -84,8 +132,9 @@ if __name__ == '__main__':
             i = i + 1
         print("Newest:" + newest)
         if newest:
-            arg0 = path + "0_" + newest + ".pth"
-            arg2 = path + "2_" + newest + ".pth"
+            suffix = ".npz" if os.path.isfile(path + "0_" + newest + ".npz") else ".pth"  # Exported numpy models
+            arg0 = path + "0_" + newest + suffix
+            arg2 = path + "2_" + newest + suffix
             parser.add_argument('--models', nargs='*', default=[arg0, 'random', arg2, 'random'])
             args = parser.parse_args()
 
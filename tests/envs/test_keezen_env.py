@@ -1,9 +1,65 @@
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
 import unittest
 import numpy as np
 
 import rlcard
+from rlcard.envs.keezen import KeezenVecEnv, tournament
+from rlcard.envs.keezen_remote import TournamentCoordinator, receive_message, run_tournament_worker, send_message
 from rlcard.agents.random_agent import RandomAgent
+from rlcard.games.keezen.agent import RuleBasedAgent, RuleBasedAgentAdapter
+from rlcard.games.keezen.board import BoardState
+from rlcard.games.keezen.card import CardState
 from rlcard.games.keezen.game import GameActions
+from rlcard.games.keezen.move import CompactMove
+from rlcard.games.keezen.numpyagent import NumpyDMCAgent, get_action_agreement, get_reference_states
+from rlcard.games.keezen.observation import encode_observation
+
+
+def load_rule_based_agents(env):
+    return [RuleBasedAgentAdapter(RuleBasedAgent(env.game.game)) for _ in range(env.num_players)]
+
+
+def load_random_agents(env):
+    return [RandomAgent(env.num_actions) for _ in range(env.num_players)]
+
+
+def load_rule_based_models(env, models):
+    return load_rule_based_agents(env)
+
+
+def load_rule_based_models_slowly(env, models):
+    time.sleep(2)  # Longer than the job timeout of the coordinator
+    return load_rule_based_agents(env)
+
+
+class LinearValueAgent:
+    """ Agent with a value network like DMCAgent: a linear function of the state and action features."""
+    use_raw = False
+
+    def __init__(self, seed):
+        self.weights = np.random.default_rng(seed).integers(-50, 50, 615 + 68).astype(np.float32)
+
+    def forward(self, obs, actions):
+        return np.concatenate((obs, actions), axis=1) @ self.weights
+
+    def eval_step(self, state):
+        action_keys = list(state['legal_actions'].keys())
+        actions = np.array(list(state['legal_actions'].values()), dtype=np.float32)
+        obs = np.repeat(state['obs'][np.newaxis].astype(np.float32), len(action_keys), axis=0)
+        return action_keys[int(np.argmax(self.forward(obs, actions)))], {}
+
+
+def load_value_agents(env):
+    rule_based_agent = RuleBasedAgentAdapter(RuleBasedAgent(env.game.game))
+    return [LinearValueAgent(0), rule_based_agent, LinearValueAgent(2), rule_based_agent]
+
+
+def load_value_and_random_agents(env):
+    return [LinearValueAgent(0), RandomAgent(env.num_actions), LinearValueAgent(2), RandomAgent(env.num_actions)]
 
 
 class TestKeezenEnv(unittest.TestCase):
@@ -13,6 +69,58 @@ class TestKeezenEnv(unittest.TestCase):
         state, _ = env.reset()
         self.assertEqual(state['obs'].size, 615)
 
+    def test_incremental_observation(self):
+        env = rlcard.make('keezen')
+        state, _ = env.reset()
+        for _ in range(40):
+            game_state = env.game.game_state
+            cur_player = game_state.move_player
+            own_cards = CardState.get_card_state_as_matrix(game_state.player_cards[cur_player])
+            played_cards = CardState.get_card_state_as_matrix(game_state.played_cards)
+            board_matrix = BoardState.get_board_state_as_matrix(game_state.fields_with_marbles, env.game.game.board,
+                                                                cur_player, None, env.game.game.players)
+            active_player = np.zeros(5, dtype=np.int8)
+            active_player[env.game.game.players.index(cur_player)] = 1
+            expected = np.concatenate((active_player, own_cards, played_cards, board_matrix))
+            self.assertTrue(np.array_equal(expected, state['obs']))
+            out = np.ones(615, dtype=np.int8)
+            encode_observation(game_state, env.game.game.players.index(cur_player), env.game.game.players,
+                               env.game.game.board, out)
+            self.assertTrue(np.array_equal(expected, out))
+            action = np.random.choice(list(state['legal_actions'].keys()))
+            state, _ = env.step(action)
+
+    def test_stateless_observation(self):
+        env = rlcard.make('keezen', config={'seed': 1})
+        stateless_env = rlcard.make('keezen', config={'seed': 1, 'observation_mode': 'stateless'})
+        state, _ = env.reset()
+        stateless_state, _ = stateless_env.reset()
+        observations = []
+        for _ in range(40):
+            self.assertTrue(np.array_equal(state['obs'], stateless_state['obs']))
+            observations.append((state['obs'], stateless_state['obs']))
+            action = np.random.choice(list(state['legal_actions'].keys()))
+            state, _ = env.step(action)
+            stateless_state, _ = stateless_env.step(action)
+        for obs, stateless_obs in observations:  # The states keep their observations
+            self.assertTrue(np.array_equal(obs, stateless_obs))
+
+    def test_allowed_moves(self):
+        env = rlcard.make('keezen', config={'seed': 2})
+        state, _ = env.reset()
+        rng = np.random.default_rng(2)
+        states = []
+        for _ in range(40):
+            game_state = env.game.game_state
+            states.append((state, list(game_state.player_cards[game_state.move_player])))
+            action = rng.choice(list(state['legal_actions'].keys()))
+            state, _ = env.step(action)
+        # The moves are built on access, after the game went on
+        for state, player_cards in states:
+            self.assertEqual(state['compact_moves'], [CompactMove.from_move(move) for move in state['allowed_moves']])
+            for move in state['allowed_moves']:
+                self.assertTrue(all(card in player_cards for card in move.cards))
+
     def test_get_legal_actions(self):
         env = rlcard.make('keezen')
         env.set_agents([RandomAgent(env.num_actions) for _ in range(env.num_players)])
@@ -21,6 +129,146 @@ class TestKeezenEnv(unittest.TestCase):
         for legal_action in legal_actions.keys():
             self.assertLessEqual(legal_action, 271)
 
+    def test_legal_action_arrays(self):
+        env = rlcard.make('keezen', config={'legal_actions_mode': 'arrays'})
+        state, _ = env.reset()
+        for _ in range(20):
+            legal_actions = state['legal_actions']
+            num_legal_actions = state['num_legal_actions']
+            self.assertEqual(len(legal_actions), num_legal_actions)
+            self.assertEqual((271,), state['legal_action_mask'].shape)
+            self.assertEqual(set(legal_actions.keys()), set(np.flatnonzero(state['legal_action_mask'])))
+            for action_id, features in zip(state['legal_action_ids'][:num_legal_actions],
+                                           state['legal_action_features'][:num_legal_actions]):
+                self.assertTrue(np.array_equal(legal_actions[action_id], features))
+            self.assertTrue(np.all(state['legal_action_ids'][num_legal_actions:] == -1))
+            action = np.random.choice(list(legal_actions.keys()))
+            state, _ = env.step(action)
+
+    def test_seed(self):
+        def get_stock_cards(config):
+            env = rlcard.make('keezen', config=config)
+            env.reset()
+            return [str(card) for card in env.game.game_state.stock_cards]
+        stock_cards = get_stock_cards({'seed': 7, 'game_index': 3})
+        self.assertEqual(stock_cards, get_stock_cards({'seed': 7, 'game_index': 3}))
+        self.assertNotEqual(stock_cards, get_stock_cards({'seed': 7, 'game_index': 4}))
+
+    def test_vec_env(self):
+        vec_env = KeezenVecEnv(3, config={'seed': 5})
+        states = vec_env.reset()
+        self.assertEqual((3, 615), states['obs'].shape)
+        self.assertEqual((3, 271, 68), states['legal_action_features'].shape)
+        num_games = 0
+        for _ in range(1500):
+            actions = [np.random.choice(np.flatnonzero(mask)) for mask in states['legal_action_mask']]
+            states, payoffs, dones = vec_env.step(actions)
+            for i, env in enumerate(vec_env.envs):
+                self.assertTrue(np.array_equal(states['obs'][i], vec_env.states[i]['obs']))
+                self.assertEqual(states['player_id'][i], env.get_player_id())
+            self.assertTrue(np.all(payoffs.sum(axis=1) == 2 * dones))
+            num_games += int(dones.sum())
+        self.assertGreater(num_games, 0)
+
+    def test_tournament(self):
+        rewards, payoffs, lengths = tournament({'seed': 3}, load_rule_based_agents, 4, num_workers=1)
+        self.assertEqual((4, 4), payoffs.shape)
+        self.assertTrue(np.all(payoffs.sum(axis=1) == 2))
+        self.assertTrue(np.allclose(rewards, payoffs.mean(axis=0)))
+        _, pool_payoffs, pool_lengths = tournament({'seed': 3}, load_rule_based_agents, 4, num_workers=2)
+        self.assertTrue(np.array_equal(payoffs, pool_payoffs))
+        self.assertTrue(np.array_equal(lengths, pool_lengths))
+        _, payoffs, lengths = tournament({'seed': 3}, load_random_agents, 6, num_workers=1)
+        _, pool_payoffs, pool_lengths = tournament({'seed': 3}, load_random_agents, 6, num_workers=2)
+        self.assertTrue(np.array_equal(payoffs, pool_payoffs))
+        self.assertTrue(np.array_equal(lengths, pool_lengths))
+
+    def test_batched_tournament(self):
+        expected_rewards, expected_payoffs, expected_lengths = tournament({'seed': 5}, load_value_agents, 6, 1)
+        rewards, payoffs, lengths = tournament({'seed': 5}, load_value_agents, 6, 1, num_concurrent=4)
+        self.assertEqual(expected_rewards, rewards)
+        self.assertTrue(np.array_equal(expected_payoffs, payoffs))
+        self.assertTrue(np.array_equal(expected_lengths, lengths))
+        # Random seats draw from the global generators, their state is kept per game
+        load_agents = load_value_and_random_agents
+        expected_rewards, expected_payoffs, expected_lengths = tournament({'seed': 6}, load_agents, 6, 1)
+        for num_workers, num_concurrent in ((1, 4), (2, 2)):
+            rewards, payoffs, lengths = tournament({'seed': 6}, load_agents, 6, num_workers,
+                                                   num_concurrent=num_concurrent)
+            self.assertEqual(expected_rewards, rewards)
+            self.assertTrue(np.array_equal(expected_payoffs, payoffs))
+            self.assertTrue(np.array_equal(expected_lengths, lengths))
+
+    def test_remote_tournament(self):
+        coordinator = TournamentCoordinator(job_timeout=60)
+        coordinator.add_tournament(['rulebased'] * 4, 4, {'seed': 3}, games_per_job=1)
+        with socket.create_connection(coordinator.address) as sock:  # A worker that dies during its job
+            send_message(sock, {'type': 'get'})
+            self.assertEqual('job', receive_message(sock)['type'])
+        worker = multiprocessing.get_context('spawn').Process(
+            target=run_tournament_worker, args=(*coordinator.address, load_rule_based_models))
+        worker.start()
+        try:
+            [(rewards, payoffs, lengths)] = coordinator.wait(timeout=60)
+            coordinator.close()
+            worker.join(10)
+            self.assertEqual(0, worker.exitcode)
+        finally:
+            worker.terminate()
+            coordinator.close()
+        expected_rewards, expected_payoffs, expected_lengths = tournament({'seed': 3}, load_rule_based_agents, 4, 1)
+        self.assertEqual(expected_rewards, rewards)
+        self.assertTrue(np.array_equal(expected_payoffs, payoffs))
+        self.assertTrue(np.array_equal(expected_lengths, lengths))
+
+    def test_remote_tournament_job_timeout(self):
+        coordinator = TournamentCoordinator(job_timeout=1)
+        coordinator.add_tournament(['rulebased'] * 4, 2, {'seed': 3}, games_per_job=1)
+        worker = multiprocessing.get_context('spawn').Process(
+            target=run_tournament_worker, args=(*coordinator.address, load_rule_based_models_slowly))
+        worker.start()
+        try:  # The worker connects again after its first job timed out
+            [(rewards, payoffs, lengths)] = coordinator.wait(timeout=60)
+            coordinator.close()
+            worker.join(10)
+            self.assertEqual(0, worker.exitcode)
+        finally:
+            worker.terminate()
+            coordinator.close()
+        expected_rewards, expected_payoffs, expected_lengths = tournament({'seed': 3}, load_rule_based_agents, 2, 1)
+        self.assertTrue(np.array_equal(expected_payoffs, payoffs))
+        self.assertTrue(np.array_equal(expected_lengths, lengths))
+
+    def test_numpy_dmc_agent(self):
+        rng = np.random.default_rng(0)
+        sizes = [615 + 68, 32, 32, 1]
+        agent = NumpyDMCAgent([rng.standard_normal(shape) for shape in zip(sizes[:-1], sizes[1:])],
+                              [rng.standard_normal(size) for size in sizes[1:]])
+        with tempfile.TemporaryDirectory() as directory:
+            agent.save(os.path.join(directory, 'agent.npz'))
+            loaded_agent = NumpyDMCAgent.load(os.path.join(directory, 'agent.npz'))
+        env = rlcard.make('keezen')
+        state, _ = env.reset()
+        for _ in range(20):
+            action_keys, values = loaded_agent.predict(state)
+            obs = np.repeat(state['obs'][np.newaxis].astype(np.float32), len(action_keys), axis=0)
+            actions = np.array(list(state['legal_actions'].values()), dtype=np.float32)
+            self.assertTrue(np.allclose(agent.forward(obs, actions), values, rtol=1e-4, atol=1e-3))
+            action, _ = loaded_agent.eval_step(state)
+            self.assertEqual(action_keys[np.argmax(values)], action)
+            state, _ = env.step(action)
+
+    def test_action_agreement(self):
+        rng = np.random.default_rng(0)
+        sizes = [615 + 68, 64, 64, 1]
+        agent = NumpyDMCAgent([rng.standard_normal(shape) / np.sqrt(shape[0]) for shape in zip(sizes[:-1], sizes[1:])],
+                              [rng.standard_normal(size) * 0.1 for size in sizes[1:]])
+        states = get_reference_states(rlcard.make('keezen', config={'seed': 0}), 100, np.random.default_rng(1))
+        self.assertEqual(100, len(states))
+        self.assertEqual(1.0, get_action_agreement(agent, agent, states))
+        rounded_agent = NumpyDMCAgent([np.round(weight, 1) for weight in agent.weights], agent.biases)
+        self.assertGreater(get_action_agreement(rounded_agent, agent, states), 0.5)
+
     def test_step(self):
         env = rlcard.make('keezen')
         state, _ = env.reset()
@@ -1,8 +1,32 @@
+import pickle
 import unittest
+from copy import copy
 import numpy as np
 
-from rlcard.games.keezen.game import GameActions
+from rlcard.games.keezen.batchgame import BatchGame, BatchRandomAgent, BatchProgressAgent
+from rlcard.games.keezen.board import FieldsWithMarbles
+from rlcard.games.keezen.card import CardState
+from rlcard.games.keezen.game import ActionCodec, Game, GameActions
 from rlcard.games.keezen.keezengameadapter import KeezenGameAdapter
+from rlcard.games.keezen.move import CompactMove
+from rlcard.games.keezen.zobrist import Zobrist
+
+
+def _play_random(game, steps, seed):
+    """Starts a game of the adapter dealt with the seed and plays random legal actions, drawn from a generator with
+    the seed. Yields the game state before each action, for at most steps actions (None plays until the game is
+    over)."""
+    game.game.seed(seed)
+    state, _ = game.init_game()
+    rng = np.random.default_rng(seed)
+    step = 0
+    while steps is None or step < steps:
+        yield game.game_state
+        if game.is_over():
+            return
+        action = rng.choice(list(state['legal_actions'].keys()))
+        state, _ = game.step(game.game.action_codec.get_raw_action(action))
+        step += 1
 
 
 class TestKeezenMethods(unittest.TestCase):
@@ -36,24 +60,169 @@ class TestKeezenMethods(unittest.TestCase):
         for action in legal_actions:
             action_str = GameActions.ALL_ACTIONS_271[action]
             self.assertIn(action_str, game._ACTION_SPACE)
+        self.assertEqual(set(legal_actions.keys()), set(game.game.legal_moves.keys()))
 
     def test_step(self):
         game = KeezenGameAdapter()
         state, _ = game.init_game()
         legal_actions = state['legal_actions']
-        action = np.random.choice(list(legal_actions.keys()))
+        action = np.random.default_rng(0).choice(list(legal_actions.keys()))
         action_str = GameActions.ALL_ACTIONS_271[action]
         state, next_player_id = game.step(action_str)
         self.assertEqual(state['game_state'].move_number, 1)
 
-    def test_get_rewards(self):
+    def test_action_codec(self):
+        action_codec = ActionCodec(GameActions.ALL_ACTIONS_271)
+        self.assertEqual(42, action_codec.indexes[ActionCodec.get_raw_action_key('SP07P0')])
+        self.assertEqual('SP07P0', action_codec.get_raw_action(42))
+        game = KeezenGameAdapter()
+        for game_state in _play_random(game, 40, 0):
+            for compact_move in game_state.compact_moves:
+                raw_action = CompactMove.get_raw_action(compact_move, game_state.move_player, game.game, game_state)
+                self.assertEqual(game._ACTION_SPACE[raw_action],
+                                 game.game.action_codec.get_action_index(compact_move, game_state.move_player,
+                                                                         game.game, game_state))
+
+    def test_action_matrices(self):
+        game = KeezenGameAdapter()
+        for game_state in _play_random(game, 40, 1):
+            player = game_state.move_player
+            player_cards = game_state.player_cards[player]
+            action_matrices = CompactMove.get_action_matrices(game_state.compact_moves, player, player_cards,
+                                                              game.game, game_state)
+            self.assertEqual((len(game_state.compact_moves), 68), action_matrices.shape)
+            for compact_move, action_matrix in zip(game_state.compact_moves, action_matrices):
+                expected_matrix = CompactMove.get_action_matrix(compact_move, player,
+                                                                CompactMove.get_cards(compact_move, player_cards),
+                                                                game.game, game_state)
+                self.assertTrue(np.array_equal(expected_matrix, action_matrix))
+
+    def test_legal_actions_memo(self):
         game = KeezenGameAdapter()
         state, _ = game.init_game()
-        while not game.is_over():
-            legal_actions = state['legal_actions']
-            action = np.random.choice(list(legal_actions.keys()))
-            action_str = GameActions.ALL_ACTIONS_271[action]
-            state, next_player_id = game.step(action_str)
+        compact_moves = game.game_state.compact_moves
+        self.assertEqual(state['legal_actions'].keys(), game.get_legal_actions().keys())
+        game.get_state_for_current_player()
+        self.assertIs(compact_moves, game.game_state.compact_moves)
+        action = np.random.default_rng(0).choice(list(state['legal_actions'].keys()))
+        old_game_state = game.game_state
+        game.step(GameActions.ALL_ACTIONS_271[action])
+        self.assertIsNone(old_game_state.legal_actions)
+        self.assertIsNotNone(game.game_state.legal_actions)
+
+    def test_zobrist_key(self):
+        game = KeezenGameAdapter()
+        keys = set()
+        for game_state in _play_random(game, 60, 2):
+            expected_key = FieldsWithMarbles(dict(game_state.fields_with_marbles)).zobrist_key ^ \
+                Zobrist.get_cards_and_turn_key(game_state, game.game.players)
+            self.assertEqual(expected_key, game_state.get_zobrist_key())
+            self.assertTrue(np.array_equal(CardState.get_card_counts_of_state(
+                game_state.stock_cards, game_state.player_cards, game_state.played_cards, game.game.players),
+                game_state.card_counts))
+            keys.add(game_state.get_zobrist_key())
+        self.assertGreater(len(keys), 1)
+
+    def test_fields_with_marbles(self):
+        game = KeezenGameAdapter()
+        for _ in _play_random(game, 30, 3):
+            pass
+        fields_with_marbles = game.game_state.fields_with_marbles
+        unpickled = pickle.loads(pickle.dumps(fields_with_marbles))
+        self.assertEqual([(field.id_, marble.id_) for field, marble in fields_with_marbles.items()],
+                         [(field.id_, marble.id_) for field, marble in unpickled.items()])
+        self.assertEqual(fields_with_marbles.zobrist_key, unpickled.zobrist_key)
+        self.assertEqual(fields_with_marbles.marble_ranks, unpickled.marble_ranks)
+        # The dict mutators keep the index up to date
+        copied = FieldsWithMarbles()
+        copied.update(fields_with_marbles)
+        self.assertEqual(fields_with_marbles.zobrist_key, copied.zobrist_key)
+        field, marble = copied.popitem()
+        self.assertIs(marble, copied.pop(field, marble))
+        self.assertIsNone(copied.marble_fields[marble.id_])
+        self.assertIs(marble, copied.setdefault(field, marble))
+        self.assertIs(field, copied.marble_fields[marble.id_])
+        self.assertEqual(fields_with_marbles.zobrist_key, copied.zobrist_key)
+        self.assertEqual(fields_with_marbles.marble_ranks, copied.marble_ranks)
+
+    def test_game_state_copy_on_write(self):
+        game = KeezenGameAdapter()
+        snapshots = []
+        for current_game_state in _play_random(game, 60, 4):
+            game_state = copy(current_game_state)
+            self.assertIs(current_game_state.stock_cards, game_state.stock_cards)
+            snapshots.append((game_state, game_state.get_zobrist_key(), game_state.move_number,
+                              [list(cards) for cards in game_state.player_cards.values()]))
+        for game_state, zobrist_key, move_number, player_cards in snapshots:
+            expected_key = FieldsWithMarbles(dict(game_state.fields_with_marbles)).zobrist_key ^ \
+                Zobrist.get_cards_and_turn_key(game_state, game.game.players)
+            self.assertEqual(zobrist_key, expected_key)
+            self.assertEqual(move_number, game_state.move_number)
+            self.assertEqual(player_cards, [list(cards) for cards in game_state.player_cards.values()])
+
+    def test_apply_undo(self):
+        game = KeezenGameAdapter()
+
+        def get_snapshot(game_state):
+            return (game_state.get_zobrist_key(), list(game_state.fields_with_marbles.marble_fields),
+                    [list(cards) for cards in game_state.player_cards.values()], list(game_state.played_cards),
+                    list(game_state.stock_cards), dict(game_state.players_play_with_color), game_state.move_player,
+                    game_state.deal_player, game_state.move_number, game_state.round_number,
+                    game_state.card_counts.tolist(), game_state.observation.buffer.tolist(),
+                    game_state.observation.hand_planes.tolist())
+
+        for game_state in _play_random(game, 60, 5):
+            snapshot = get_snapshot(game_state)
+            for move in game.game.get_moves_from_compact(game_state.compact_moves, game_state):
+                game.game.apply(move, game_state)
+                self.assertIs(game_state, game.game.undo())
+                self.assertEqual(snapshot, get_snapshot(game_state))
+        self.assertIsNone(game.game.undo())
+
+    def test_step_back(self):
+        game = KeezenGameAdapter(allow_step_back=True)
+        keys = []
+        for game_state in _play_random(game, 30, 6):
+            keys.append(game_state.get_zobrist_key())
+        while keys:
+            state, _ = game.step_back()
+            self.assertEqual(keys.pop(), state['game_state'].get_zobrist_key())
+        self.assertIsNone(game.step_back())
+
+    def test_batch_game_moves(self):
+        game = KeezenGameAdapter()
+        batch_game = BatchGame(game.game, 2, Game.create_rng(0))
+        for game_state in _play_random(game, 100, 7):
+            batch_game.set_game_state(1, game.game, game_state)
+            slots = np.flatnonzero(batch_game.get_legal_moves()[1])
+            self.assertEqual(sorted(game.game.get_allowed_compact_moves(game_state), key=str),
+                             sorted(batch_game.get_compact_moves(1, slots), key=str))
+
+    def test_batch_game_play(self):
+        batch_game = BatchGame(KeezenGameAdapter().game, 8, Game.create_rng(0))
+        rng = np.random.default_rng(0)
+        payoffs, lengths = batch_game.play([BatchProgressAgent(rng), BatchRandomAgent(rng)] * 2, 12)
+        self.assertEqual((12, 4), payoffs.shape)
+        self.assertTrue(np.all(payoffs.sum(axis=1) == 2))
+        self.assertTrue(np.all(lengths > 0))
+
+    def test_simple_game(self):
+        KeezenGameAdapter.game_type = "KeezSimple"
+        try:
+            game = KeezenGameAdapter()
+        finally:
+            KeezenGameAdapter.game_type = "Keez"
+        self.assertEqual(Game.GAME_ACTIONS_SIMPLE, len(GameActions.ALL_ACTIONS_SIMPLE))
+        for seed in range(5):
+            for _ in _play_random(game, None, seed):
+                pass
+            _, rewards = game.game.is_over(game.game_state)
+            self.assertEqual(sum(rewards), 1)  # Without switching color only the first finished player wins
+
+    def test_get_rewards(self):
+        game = KeezenGameAdapter()
+        for _ in _play_random(game, None, 8):
+            pass
         _, rewards = game.game.is_over(game.game_state)
         self.assertEqual(sum(rewards), 2)
 